@@ -2,18 +2,29 @@
 
 import asyncio
 import logging
+import struct
+import time
+from datetime import timedelta
 
 import voluptuous as vol
 
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.discovery import async_load_platform
-from homeassistant.helpers.event import TrackTemplate, async_track_template_result
-from homeassistant.helpers.template import Template
+from homeassistant.exceptions import TemplateError
+from homeassistant.helpers.event import (
+    TrackTemplate,
+    async_call_later,
+    async_track_state_change_event,
+    async_track_template_result,
+    async_track_time_interval,
+)
 from homeassistant.helpers.script import Script
+from homeassistant.helpers.storage import STORAGE_DIR
 from homeassistant.core import callback, Context
 from homeassistant.const import EVENT_HOMEASSISTANT_STOP
 from homeassistant.const import (
     EVENT_HOMEASSISTANT_STOP,
+    CONF_NAME,
     CONF_VALUE_TEMPLATE,
     CONF_ATTRIBUTE,
     CONF_ENTITY_ID,
@@ -23,18 +34,97 @@ from homeassistant.const import (
     CONF_SERVICE_DATA,
 )
 
-from .crestron import CrestronXsig
-from .const import CONF_PORT, HUB, DOMAIN, CONF_JOIN, CONF_SCRIPT, CONF_TO_HUB, CONF_FROM_HUB
+from .crestron import (
+    CrestronXsig,
+    DEFAULT_MAX_SERIAL,
+    DEFAULT_SLICE_FRAMES,
+    DEFAULT_SLICE_TIME,
+    DEFAULT_TRACE_SIZE,
+    DEFAULT_WEIGHTS,
+    MERGE_FIRST,
+    MERGE_LAST,
+    PRIORITY_BULK,
+    Pacer,
+    SCHEDULING_STRICT,
+    SCHEDULING_WEIGHTED,
+    format_trace,
+)
+from .capture import CaptureWriter
+from .codec import MAX_SERIAL_LENGTH
+from .snapshot import dump_snapshot, read_snapshot, write_snapshot
+from .transform import TRANSFORM_SCHEMA, compile_transform_config
+from .profiler import CrestronProfiler, MODE_CPROFILE, MODE_SAMPLE
+from .const import (
+    CONF_PORT,
+    HUB,
+    HUBS,
+    CONF_HUB,
+    DOMAIN,
+    CONF_JOIN,
+    CONF_SCRIPT,
+    CONF_TO_HUB,
+    CONF_FROM_HUB,
+    CONF_DIAGNOSTICS,
+    CONF_MODE,
+    CONF_DURATION,
+    CONF_INTERVAL,
+    SERVICE_PROFILE,
+    CONF_FILENAME,
+    SERVICE_CAPTURE_START,
+    SERVICE_CAPTURE_STOP,
+    CONF_TRACE_SIZE,
+    CONF_COUNT,
+    SERVICE_DUMP_TRACE,
+    CONF_MULTI_CONNECTION,
+    CONF_MERGE,
+    CONF_SNAPSHOT,
+    CONF_SNAPSHOT_INTERVAL,
+    CONF_SNAPSHOT_MMAP,
+    CONF_BULK_LOAD,
+    CONF_BULK_LOAD_QUIET_TIME,
+    CONF_BULK_LOAD_MAX_FRAMES,
+    CONF_AVAILABILITY_DELAY,
+    CONF_KEEPALIVE,
+    CONF_KEEPALIVE_INTERVAL,
+    CONF_KEEPALIVE_COUNT,
+    CONF_IDLE_TIMEOUT,
+    CONF_HEARTBEAT_JOIN,
+    CONF_HEARTBEAT_INTERVAL,
+    CONF_STANDBY,
+    CONF_OUTBOUND_SCHEDULING,
+    CONF_OUTBOUND_WEIGHTS,
+    CONF_OUTBOUND_RATE_LIMIT,
+    CONF_BYTES_PER_SECOND,
+    CONF_FRAMES_PER_SECOND,
+    CONF_BURST_BYTES,
+    CONF_BURST_FRAMES,
+    CONF_OUTBOUND_DEDUP,
+    CONF_RATE_LIMIT,
+    CONF_SERIAL_MAX_LENGTH,
+    CONF_SERIAL_ENCODING,
+    CONF_SERIAL_ERRORS,
+    CONF_READ_SLICE_FRAMES,
+    CONF_READ_SLICE_TIME,
+    CONF_INBOUND_CONFLATION,
+)
 #from .control_surface_sync import ControlSurfaceSync
 
 _LOGGER = logging.getLogger(__name__)
 
+DIGITAL_ON_VALUES = (STATE_ON, "True", "true", True, 1, "1")
+DIGITAL_OFF_VALUES = (STATE_OFF, "False", "false", False, 0, "0")
+
 TO_JOINS_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_JOIN): cv.string,
         vol.Optional(CONF_ENTITY_ID): cv.entity_id,
         vol.Optional(CONF_ATTRIBUTE): cv.string,
-        vol.Optional(CONF_VALUE_TEMPLATE): cv.template
+        vol.Optional(CONF_VALUE_TEMPLATE): cv.template,
+        # Send at most once per rate_limit; the last value is sent when it ends
+        vol.Optional(CONF_RATE_LIMIT): vol.All(
+            cv.time_period, cv.positive_timedelta
+        ),
+        **TRANSFORM_SCHEMA,
     }
 )
 
@@ -45,19 +135,143 @@ FROM_JOINS_SCHEMA = vol.Schema(
     }
 )
 
+DEFAULT_SNAPSHOT_INTERVAL = timedelta(seconds=60)
+
+RATE_LIMIT_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Optional(CONF_BYTES_PER_SECOND): vol.All(vol.Coerce(float), vol.Range(min=10)),
+            vol.Optional(CONF_FRAMES_PER_SECOND): vol.All(vol.Coerce(float), vol.Range(min=1)),
+            vol.Optional(CONF_BURST_BYTES): vol.All(vol.Coerce(float), vol.Range(min=255)),
+            vol.Optional(CONF_BURST_FRAMES): vol.All(vol.Coerce(float), vol.Range(min=1)),
+        }
+    ),
+    cv.has_at_least_one_key(CONF_BYTES_PER_SECOND, CONF_FRAMES_PER_SECOND),
+)
+
+HUB_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_NAME): cv.slug,
+        vol.Required(CONF_PORT): cv.port,
+        vol.Optional(CONF_TO_HUB): vol.All(cv.ensure_list, [TO_JOINS_SCHEMA]),
+        vol.Optional(CONF_FROM_HUB): vol.All(cv.ensure_list, [FROM_JOINS_SCHEMA]),
+        vol.Optional(CONF_DIAGNOSTICS, default=False): cv.boolean,
+        vol.Optional(CONF_TRACE_SIZE, default=DEFAULT_TRACE_SIZE): cv.positive_int,
+        vol.Optional(CONF_MULTI_CONNECTION, default=False): cv.boolean,
+        vol.Optional(CONF_MERGE, default=MERGE_LAST): vol.In([MERGE_LAST, MERGE_FIRST]),
+        vol.Optional(CONF_SNAPSHOT, default=False): cv.boolean,
+        vol.Optional(
+            CONF_SNAPSHOT_INTERVAL, default=DEFAULT_SNAPSHOT_INTERVAL
+        ): cv.time_period,
+        vol.Optional(CONF_SNAPSHOT_MMAP, default=False): cv.boolean,
+        vol.Optional(CONF_BULK_LOAD, default=False): cv.boolean,
+        vol.Optional(CONF_BULK_LOAD_QUIET_TIME, default=0.25): vol.All(
+            vol.Coerce(float), vol.Range(min=0.01, max=60)
+        ),
+        vol.Optional(CONF_BULK_LOAD_MAX_FRAMES): cv.positive_int,
+        vol.Optional(CONF_AVAILABILITY_DELAY, default=0): vol.All(
+            vol.Coerce(float), vol.Range(min=0, max=3600)
+        ),
+        vol.Optional(CONF_KEEPALIVE): cv.positive_int,
+        vol.Optional(CONF_KEEPALIVE_INTERVAL, default=5): cv.positive_int,
+        vol.Optional(CONF_KEEPALIVE_COUNT, default=3): cv.positive_int,
+        vol.Optional(CONF_IDLE_TIMEOUT): vol.All(
+            vol.Coerce(float), vol.Range(min=1, max=3600)
+        ),
+        vol.Optional(CONF_HEARTBEAT_JOIN): vol.All(
+            cv.positive_int, vol.Range(max=4096)
+        ),
+        vol.Optional(CONF_HEARTBEAT_INTERVAL, default=10): vol.All(
+            vol.Coerce(float), vol.Range(min=0.1, max=3600)
+        ),
+        vol.Optional(CONF_STANDBY, default=False): cv.boolean,
+        vol.Optional(CONF_OUTBOUND_SCHEDULING, default=SCHEDULING_STRICT): vol.In(
+            [SCHEDULING_STRICT, SCHEDULING_WEIGHTED]
+        ),
+        # Lane weights (high, normal, bulk) for weighted scheduling
+        vol.Optional(CONF_OUTBOUND_WEIGHTS, default=list(DEFAULT_WEIGHTS)): vol.ExactSequence(
+            [vol.All(vol.Coerce(int), vol.Range(min=1, max=100))] * 3
+        ),
+        vol.Optional(CONF_OUTBOUND_RATE_LIMIT): RATE_LIMIT_SCHEMA,
+        vol.Optional(CONF_OUTBOUND_DEDUP, default=True): cv.boolean,
+        vol.Optional(CONF_SERIAL_MAX_LENGTH, default=DEFAULT_MAX_SERIAL): vol.All(
+            cv.positive_int, vol.Range(min=MAX_SERIAL_LENGTH, max=65536)
+        ),
+        vol.Optional(CONF_SERIAL_ENCODING, default="utf-8"): vol.In(
+            ["utf-8", "latin-1", "cp1252"]
+        ),
+        vol.Optional(CONF_SERIAL_ERRORS, default="replace"): vol.In(
+            ["strict", "replace", "ignore", "backslashreplace"]
+        ),
+        vol.Optional(CONF_READ_SLICE_FRAMES, default=DEFAULT_SLICE_FRAMES): vol.All(
+            cv.positive_int, vol.Range(min=10)
+        ),
+        vol.Optional(CONF_READ_SLICE_TIME, default=DEFAULT_SLICE_TIME): vol.All(
+            vol.Coerce(float), vol.Range(min=0.001, max=1)
+        ),
+        vol.Optional(CONF_INBOUND_CONFLATION, default=False): cv.boolean,
+    }
+)
+
+
+def _validate_hubs(hubs):
+    """With more than one control system every hub needs a unique name and port"""
+    if len(hubs) > 1:
+        names = [hub.get(CONF_NAME) for hub in hubs]
+        if None in names:
+            raise vol.Invalid("name is required when more than one hub is configured")
+        if len(set(names)) != len(names):
+            raise vol.Invalid("hub names must be unique")
+        ports = [hub[CONF_PORT] for hub in hubs]
+        if len(set(ports)) != len(ports):
+            raise vol.Invalid("hub ports must be unique")
+    return hubs
+
+
 CONFIG_SCHEMA = vol.Schema(
     {
-        DOMAIN: vol.Schema(
-            {
-                vol.Required(CONF_PORT): cv.port,
-                vol.Optional(CONF_TO_HUB): vol.All(cv.ensure_list, [TO_JOINS_SCHEMA]),
-                vol.Optional(CONF_FROM_HUB): vol.All(cv.ensure_list, [FROM_JOINS_SCHEMA])
-            }
-        )
+        # A single hub (the original format) or a list of named hubs
+        DOMAIN: vol.All(cv.ensure_list, [HUB_SCHEMA], _validate_hubs)
     },
     extra=vol.ALLOW_EXTRA,
 )
 
+PROFILE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_MODE, default=MODE_CPROFILE): vol.In(
+            [MODE_CPROFILE, MODE_SAMPLE]
+        ),
+        vol.Optional(CONF_DURATION, default=60): vol.All(
+            vol.Coerce(float), vol.Range(min=1, max=3600)
+        ),
+        vol.Optional(CONF_INTERVAL, default=0.005): vol.All(
+            vol.Coerce(float), vol.Range(min=0.001, max=1)
+        ),
+    }
+)
+
+CAPTURE_START_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_HUB): cv.slug,
+        vol.Optional(CONF_FILENAME): cv.string,
+    }
+)
+
+CAPTURE_STOP_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_HUB): cv.slug,
+    }
+)
+
+DUMP_TRACE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_HUB): cv.slug,
+        vol.Optional(CONF_COUNT): cv.positive_int,
+    }
+)
+
+CAPTURE_FLUSH_INTERVAL = timedelta(seconds=5)
+
 PLATFORMS = [
     "binary_sensor",
     "sensor",
@@ -74,56 +288,214 @@ async def async_setup(hass, config):
     """Set up a the crestron component."""
 
     if config.get(DOMAIN) is not None:
-        hass.data[DOMAIN] = {}
-        hub = CrestronHub(hass, config[DOMAIN])
+        hass.data[DOMAIN] = {HUBS: {}}
+        hubs = []
+        for hub_config in config[DOMAIN]:
+            hub = CrestronHub(hass, hub_config)
+            hubs.append(hub)
+
+            await hub.start()
+            hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, hub.stop)
 
-        await hub.start()
-        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, hub.stop)
+            if hub_config.get(CONF_DIAGNOSTICS):
+                # Hub throughput/health counters as diagnostic sensors
+                discovery_info = {}
+                if hub is not hubs[0]:
+                    discovery_info[CONF_HUB] = hub.name
+                hass.async_create_task(
+                    async_load_platform(hass, "sensor", DOMAIN, discovery_info, config)
+                )
+
+        def selected_hubs(call):
+            """The hub named in a service call, or all of them"""
+            name = call.data.get(CONF_HUB)
+            if name is None:
+                return hubs
+            selected = [hub for hub in hubs if hub.name == name]
+            if not selected:
+                _LOGGER.error(f"No Crestron hub named {name}")
+            return selected
+
+        profiler = CrestronProfiler(hass)
+
+        async def async_profile(call):
+            """Profile the XSIG read loop, callback dispatch and to_joins handling"""
+            await profiler.profile(
+                call.data[CONF_MODE], call.data[CONF_DURATION], call.data[CONF_INTERVAL]
+            )
+
+        hass.services.async_register(
+            DOMAIN, SERVICE_PROFILE, async_profile, schema=PROFILE_SCHEMA
+        )
+
+        async def async_capture_start(call):
+            """Start recording raw XSIG traffic"""
+            selected = selected_hubs(call)
+            filename = call.data.get(CONF_FILENAME)
+            for hub in selected:
+                if filename is not None and len(selected) > 1:
+                    # One file per hub
+                    await hub.start_capture(f"{hub.name}_{filename}")
+                else:
+                    await hub.start_capture(filename)
+
+        async def async_capture_stop(call):
+            """Stop recording raw XSIG traffic"""
+            for hub in selected_hubs(call):
+                await hub.stop_capture()
+
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_CAPTURE_START,
+            async_capture_start,
+            schema=CAPTURE_START_SCHEMA,
+        )
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_CAPTURE_STOP,
+            async_capture_stop,
+            schema=CAPTURE_STOP_SCHEMA,
+        )
+
+        async def async_dump_trace(call):
+            """Write the most recent XSIG frames to a file"""
+            for hub in selected_hubs(call):
+                await hub.dump_trace(call.data.get(CONF_COUNT))
+
+        hass.services.async_register(
+            DOMAIN, SERVICE_DUMP_TRACE, async_dump_trace, schema=DUMP_TRACE_SCHEMA
+        )
 
     return True
 
+
+def get_hub(hass, config):
+    """The CrestronXsig for a platform entry: the hub it names, or the first hub"""
+    name = config.get(CONF_HUB)
+    if name is None:
+        return hass.data[DOMAIN][HUB]
+    hub = hass.data[DOMAIN][HUBS].get(name)
+    if hub is None:
+        _LOGGER.error(f"No Crestron hub named {name}")
+    return hub
+
+
+def unique_id_prefix(config):
+    """Unique id prefix for entities on a named hub, so join numbers can repeat across hubs"""
+    name = config.get(CONF_HUB)
+    return "" if name is None else name + "-"
+
+
 class CrestronHub:
     ''' Wrapper for the CrestronXsig library '''
     def __init__(self, hass, config):
         self.hass = hass
-        self.hub = hass.data[DOMAIN][HUB] = CrestronXsig()
+        bulk_quiet_time = None
+        if config.get(CONF_BULK_LOAD):
+            bulk_quiet_time = config.get(CONF_BULK_LOAD_QUIET_TIME, 0.25)
+        keepalive = None
+        if CONF_KEEPALIVE in config:
+            keepalive = (
+                config[CONF_KEEPALIVE],
+                config.get(CONF_KEEPALIVE_INTERVAL, 5),
+                config.get(CONF_KEEPALIVE_COUNT, 3),
+            )
+        pacer = None
+        rate_limit = config.get(CONF_OUTBOUND_RATE_LIMIT)
+        if rate_limit:
+            pacer = Pacer(
+                rate_limit.get(CONF_BYTES_PER_SECOND),
+                rate_limit.get(CONF_FRAMES_PER_SECOND),
+                rate_limit.get(CONF_BURST_BYTES),
+                rate_limit.get(CONF_BURST_FRAMES),
+            )
+        self.hub = CrestronXsig(
+            trace_size=config.get(CONF_TRACE_SIZE, DEFAULT_TRACE_SIZE),
+            multi_connection=config.get(CONF_MULTI_CONNECTION, False),
+            merge=config.get(CONF_MERGE, MERGE_LAST),
+            bulk_quiet_time=bulk_quiet_time,
+            bulk_max_frames=config.get(CONF_BULK_LOAD_MAX_FRAMES),
+            availability_delay=config.get(CONF_AVAILABILITY_DELAY, 0),
+            keepalive=keepalive,
+            idle_timeout=config.get(CONF_IDLE_TIMEOUT),
+            heartbeat_join=config.get(CONF_HEARTBEAT_JOIN),
+            heartbeat_interval=config.get(CONF_HEARTBEAT_INTERVAL, 10),
+            standby=config.get(CONF_STANDBY, False),
+            scheduling=config.get(CONF_OUTBOUND_SCHEDULING, SCHEDULING_STRICT),
+            weights=config.get(CONF_OUTBOUND_WEIGHTS, DEFAULT_WEIGHTS),
+            pacer=pacer,
+            dedup=config.get(CONF_OUTBOUND_DEDUP, True),
+            max_serial=config.get(CONF_SERIAL_MAX_LENGTH, DEFAULT_MAX_SERIAL),
+            serial_encoding=config.get(CONF_SERIAL_ENCODING, "utf-8"),
+            serial_errors=config.get(CONF_SERIAL_ERRORS, "replace"),
+            slice_frames=config.get(CONF_READ_SLICE_FRAMES, DEFAULT_SLICE_FRAMES),
+            slice_time=config.get(CONF_READ_SLICE_TIME, DEFAULT_SLICE_TIME),
+            conflate=config.get(CONF_INBOUND_CONFLATION, False),
+        )
+        self.name = config.get(CONF_NAME)
         self.port = config.get(CONF_PORT)
+        # The first hub is also the default for platforms without a hub: option
+        hass.data[DOMAIN].setdefault(HUB, self.hub)
+        if self.name is not None:
+            hass.data[DOMAIN][HUBS][self.name] = self.hub
         self.context = Context()
-        self.to_hub = {}
+        self.to_hub_entities = {}
+        self.template_setters = {}
         self.tracker = None
+        self.state_tracker = None
+        self.capture = None
+        self.capture_flush = None
+        self.snapshot_path = None
+        self.snapshot_interval = config.get(CONF_SNAPSHOT_INTERVAL, DEFAULT_SNAPSHOT_INTERVAL)
+        self.snapshot_mmap = config.get(CONF_SNAPSHOT_MMAP, False)
+        self.snapshot_saver = None
+        self.snapshot_marker = 0
+        if config.get(CONF_SNAPSHOT):
+            self.snapshot_path = hass.config.path(
+                STORAGE_DIR, f"crestron_{self.name or 'default'}.joins"
+            )
         self.hub.register_sync_all_joins_callback(self.sync_joins_to_hub)
         if CONF_TO_HUB in config:
             track_templates = []
             for entity in config[CONF_TO_HUB]:
-                template_string = None
+                join = entity[CONF_JOIN]
+                rate_limit = entity.get(CONF_RATE_LIMIT)
+                setter = self.make_join_setter(
+                    join, compile_transform_config(entity)
+                )
+                limited = setter
+                if rate_limit is not None:
+                    limited = self.make_rate_limited(setter, rate_limit.total_seconds())
                 if CONF_VALUE_TEMPLATE in entity:
                     template = entity[CONF_VALUE_TEMPLATE]
-                    self.to_hub[entity[CONF_JOIN]] = template
-                    track_templates.append(TrackTemplate(template, None))
-                elif CONF_ATTRIBUTE in entity and CONF_ENTITY_ID in entity:
-                    template_string = (
-                        "{{state_attr('"
-                        + entity[CONF_ENTITY_ID]
-                        + "','"
-                        + entity[CONF_ATTRIBUTE]
-                        + "')}}"
-                    )
-                    template = Template(template_string, hass)
-                    self.to_hub[entity[CONF_JOIN]] = template
-                    track_templates.append(TrackTemplate(template, None))
+                    if template not in self.template_setters:
+                        self.template_setters[template] = []
+                        track_templates.append(TrackTemplate(template, None))
+                    self.template_setters[template].append((join, setter, limited))
                 elif CONF_ENTITY_ID in entity:
-                    template_string = "{{states('" + entity[CONF_ENTITY_ID] + "')}}"
-                    template = Template(template_string, hass)
-                    self.to_hub[entity[CONF_JOIN]] = template
-                    track_templates.append(TrackTemplate(template, None))
-            self.tracker = async_track_template_result(
-                self.hass, track_templates, self.template_change_callback
-            )
+                    # Plain entity state/attribute mirrors skip Jinja entirely
+                    self.to_hub_entities.setdefault(entity[CONF_ENTITY_ID], []).append(
+                        (join, entity.get(CONF_ATTRIBUTE), setter, limited)
+                    )
+            if track_templates:
+                self.tracker = async_track_template_result(
+                    self.hass, track_templates, self.template_change_callback
+                )
+            if self.to_hub_entities:
+                self.state_tracker = async_track_state_change_event(
+                    self.hass, list(self.to_hub_entities), self.state_change_callback
+                )
         if CONF_FROM_HUB in config:
             self.from_hub = config[CONF_FROM_HUB]
             self.hub.register_callback(self.join_change_callback)
 
     async def start(self):
+        if self.snapshot_path is not None:
+            # Before listening (and before platforms set up) so entities start warm
+            await self.load_snapshot()
+            self.snapshot_saver = async_track_time_interval(
+                self.hass, self.save_snapshot, self.snapshot_interval
+            )
         await self.hub.listen(self.port)
 
     async def stop(self, event):
@@ -131,8 +503,104 @@ class CrestronHub:
         self.hub.remove_callback(self.join_change_callback)
         if self.tracker is not None:
             self.tracker.async_remove()
+        if self.state_tracker is not None:
+            self.state_tracker()
+        await self.stop_capture()
+        if self.snapshot_saver is not None:
+            self.snapshot_saver()
+            self.snapshot_saver = None
+            await self.save_snapshot()
         await self.hub.stop()
 
+    def frames_in(self):
+        """ Join frames received so far, to tell if the store may have changed """
+        stats = self.hub.get_stats()
+        return (
+            stats["frames_in_digital"]
+            + stats["frames_in_analog"]
+            + stats["frames_in_serial"]
+        )
+
+    async def load_snapshot(self):
+        """ Restore the join store from the last snapshot, if there is one """
+        try:
+            joins = await self.hass.async_add_executor_job(
+                read_snapshot, self.snapshot_path, self.snapshot_mmap
+            )
+        except (OSError, ValueError) as err:
+            _LOGGER.warning(f"Ignoring join snapshot {self.snapshot_path}: {err}")
+            return
+        if joins is None:
+            return
+        self.hub.restore(*joins)
+        _LOGGER.info(
+            f"Restored {sum(len(store) for store in joins)} joins from {self.snapshot_path}"
+        )
+
+    async def save_snapshot(self, now=None):
+        """ Write the join store to the snapshot file if any frames arrived since the last one """
+        marker = self.frames_in()
+        if marker == self.snapshot_marker:
+            return
+        self.snapshot_marker = marker
+        try:
+            data = dump_snapshot(*self.hub.get_store())
+            await self.hass.async_add_executor_job(
+                write_snapshot, self.snapshot_path, data
+            )
+        except (OSError, struct.error, ValueError) as err:
+            # Also called from stop(): never keep the hub from shutting down
+            _LOGGER.warning(f"Could not write join snapshot {self.snapshot_path}: {err}")
+
+    async def start_capture(self, filename=None):
+        """ Record raw XSIG traffic to a capture file in the config directory """
+        await self.stop_capture()
+        if filename is None:
+            filename = f"crestron_capture_{self.file_tag()}.xcap"
+        self.capture = CaptureWriter(self.hass.config.path(filename))
+        self.hub.start_capture(self.capture)
+        self.capture_flush = async_track_time_interval(
+            self.hass, self.flush_capture, CAPTURE_FLUSH_INTERVAL
+        )
+        _LOGGER.info(f"Capturing XSIG traffic to {self.capture.path}")
+
+    async def stop_capture(self):
+        """ Stop recording and write out anything still buffered """
+        if self.capture is None:
+            return
+        self.hub.stop_capture()
+        self.capture_flush()
+        self.capture_flush = None
+        await self.flush_capture()
+        _LOGGER.info(
+            f"Stopped XSIG capture to {self.capture.path} ({self.capture.records} records)"
+        )
+        self.capture = None
+
+    async def dump_trace(self, count=None):
+        """ Write the last count frames from the trace buffer to the config directory """
+        trace = self.hub.get_trace(count)
+        path = self.hass.config.path(
+            f"crestron_trace_{self.file_tag()}.txt"
+        )
+
+        def write_trace():
+            with open(path, "w") as f:
+                f.writelines(line + "\n" for line in format_trace(trace))
+
+        await self.hass.async_add_executor_job(write_trace)
+        _LOGGER.info(f"Wrote {len(trace)} XSIG frames to {path}")
+
+    def file_tag(self):
+        """ <name>_<timestamp> for files written by this hub """
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        return timestamp if self.name is None else f"{self.name}_{timestamp}"
+
+    async def flush_capture(self, now=None):
+        capture = self.capture
+        if capture is not None:
+            await self.hass.async_add_executor_job(capture.write, capture.take())
+
     async def join_change_callback(self, cbtype, value):
         """ Call service for tracked join change (from_hub)"""
         for join in self.from_hub:
@@ -144,7 +612,11 @@ class CrestronHub:
                     if CONF_SERVICE in join and CONF_SERVICE_DATA in join:
                         data = dict(join[CONF_SERVICE_DATA])
                         _LOGGER.debug(
-                            f"join_change_callback calling service {join[CONF_SERVICE]} with data = {data} from join {cbtype} = {value}"
+                            "join_change_callback calling service %s with data = %s from join %s = %s",
+                            join[CONF_SERVICE],
+                            data,
+                            cbtype,
+                            value,
                         )
                         domain, service = join[CONF_SERVICE].split(".")
                         await self.hass.services.async_call(domain, service, data)
@@ -155,75 +627,135 @@ class CrestronHub:
                         )
                         await script.async_run({"value": value}, self.context)
                         _LOGGER.debug(
-                            f"join_change_callback calling script {join[CONF_SCRIPT]} from join {cbtype} = {value}"
+                            "join_change_callback calling script %s from join %s = %s",
+                            join[CONF_SCRIPT],
+                            cbtype,
+                            value,
                         )
 
+    def make_join_setter(self, join, transform=None):
+        """ Precompile value conversion and sending for a to_joins join ("d12", "a3", "s7")
+
+        to_joins are replication traffic and go out in the bulk priority lane.
+        """
+        hub = self.hub
+        number = int(join[1:])
+        # Digital Join
+        if join[:1] == "d":
+
+            def set_join(value):
+                if value in DIGITAL_ON_VALUES:
+                    hub.set_digital(number, True, PRIORITY_BULK)
+                elif value in DIGITAL_OFF_VALUES:
+                    hub.set_digital(number, False, PRIORITY_BULK)
+
+        # Analog Join
+        elif join[:1] == "a":
+
+            def set_join(value):
+                if value is None or value == "None":
+                    return
+                try:
+                    if isinstance(value, str):
+                        value = float(value)
+                    hub.set_analog(number, int(value), PRIORITY_BULK)
+                except (TypeError, ValueError):
+                    _LOGGER.debug("Not sending %s to analog join %s", value, number)
+
+        # Serial Join
+        else:
+
+            def set_join(value):
+                if value is not None and value != "None":
+                    hub.set_serial(number, str(value), PRIORITY_BULK)
+
+        if transform is None:
+            return set_join
+
+        def set_transformed_join(value):
+            set_join(transform(value))
+
+        return set_transformed_join
+
+    def make_rate_limited(self, setter, interval):
+        """Wrap a to_joins setter to send at most once per interval seconds
+
+        A value arriving within interval of the last send is held back; the last value held
+        back is sent when the interval ends.
+        """
+        hass = self.hass
+        last_sent = None
+        pending = None
+        timer = None
+
+        @callback
+        def send_pending(_now):
+            nonlocal last_sent, timer
+            timer = None
+            last_sent = hass.loop.time()
+            setter(pending)
+
+        def set_limited(value):
+            nonlocal last_sent, pending, timer
+            pending = value
+            if timer is not None:
+                return
+            now = hass.loop.time()
+            if last_sent is None or now - last_sent >= interval:
+                last_sent = now
+                setter(value)
+            else:
+                timer = async_call_later(hass, last_sent + interval - now, send_pending)
+
+        return set_limited
+
     @callback
     def template_change_callback(self, event, updates):
         """ Set join from value_template (to_hub)"""
-        # track_template_result = updates.pop()
         for track_template_result in updates:
-            update_result = track_template_result.result
-            update_template = track_template_result.template
-            if update_result != "None":
-                for join, template in self.to_hub.items():
-                    if template == update_template:
-                        _LOGGER.debug(
-                            f"processing template_change_callback for join {join} with result {update_result}"
-                        )
-                        # Digital Join
-                        if join[:1] == "d":
-                            value = None
-                            if update_result in [STATE_ON, "True", "true", True, 1]:
-                                value = True
-                            elif update_result in [STATE_OFF, "False", "false", False, 0]:
-                                value = False
-                            if value is not None:
-                                _LOGGER.debug(
-                                    f"template_change_callback setting digital join {int(join[1:])} to {value}"
-                                )
-                                self.hub.set_digital(int(join[1:]), value)
-                        # Analog Join
-                        if join[:1] == "a":
-                            _LOGGER.debug(
-                                f"template_change_callback setting analog join {int(join[1:])} to {int(update_result)}"
-                            )
-                            self.hub.set_analog(int(join[1:]), int(update_result))
-                        # Serial Join
-                        if join[:1] == "s":
-                            _LOGGER.debug(
-                                f"template_change_callback setting serial join {int(join[1:])} to {str(update_result)}"
-                            )
-                            self.hub.set_serial(int(join[1:]), str(update_result))
+            result = track_template_result.result
+            if isinstance(result, TemplateError):
+                continue
+            for join, _, setter in self.template_setters.get(
+                track_template_result.template, ()
+            ):
+                _LOGGER.debug(
+                    "template_change_callback setting join %s to %s", join, result
+                )
+                setter(result)
+
+    @callback
+    def state_change_callback(self, event):
+        """ Set join from entity state/attribute (to_hub), only when the mirrored value changed """
+        new_state = event.data["new_state"]
+        if new_state is None:
+            return
+        old_state = event.data["old_state"]
+        for join, attribute, _, setter in self.to_hub_entities[event.data["entity_id"]]:
+            if attribute is None:
+                value = new_state.state
+                if old_state is not None and old_state.state == value:
+                    continue
+            else:
+                value = new_state.attributes.get(attribute)
+                if old_state is not None and old_state.attributes.get(attribute) == value:
+                    continue
+            _LOGGER.debug("state_change_callback setting join %s to %s", join, value)
+            setter(value)
 
     async def sync_joins_to_hub(self):
         _LOGGER.debug("Syncing joins to control system")
-        for join, template in self.to_hub.items():
+        for template, setters in self.template_setters.items():
             result = template.async_render()
-            # Digital Join
-            if join[:1] == "d":
-                value = None
-                if result in [STATE_ON, "True", "true", True, 1]:
-                    value = True
-                elif result in [STATE_OFF, "False", "false", False, 0]:
-                    value = False
-                if value is not None:
-                    _LOGGER.debug(
-                        f"sync_joins_to_hub setting digital join {int(join[1:])} to {value}"
-                    )
-                    self.hub.set_digital(int(join[1:]), value)
-            # Analog Join
-            if join[:1] == "a":
-                if result != "None":
-                    _LOGGER.debug(
-                        f"sync_joins_to_hub setting analog join {int(join[1:])} to {int(result)}"
-                    )
-                    self.hub.set_analog(int(join[1:]), int(result))
-            # Serial Join
-            if join[:1] == "s":
-                if result != "None":
-                    _LOGGER.debug(
-                        f"sync_joins_to_hub setting serial join {int(join[1:])} to {str(result)}"
-                    )
-                    self.hub.set_serial(int(join[1:]), str(result))
-
+            # A resync is not rate limited
+            for join, setter, _ in setters:
+                setter(result)
+        for entity_id, setters in self.to_hub_entities.items():
+            state = self.hass.states.get(entity_id)
+            if state is None:
+                continue
+            for join, attribute, setter, _ in setters:
+                if attribute is None:
+                    setter(state.state)
+                else:
+                    setter(state.attributes.get(attribute))
@@ -7,13 +7,15 @@ from homeassistant.helpers.entity import Entity
 from homeassistant.const import STATE_ON, STATE_OFF, CONF_NAME, CONF_DEVICE_CLASS
 import homeassistant.helpers.config_validation as cv
 
-from .const import HUB, DOMAIN, CONF_JOIN, CONF_IS_ON_JOIN, CONF_INVERTED
+from .const import CONF_HUB, CONF_JOIN, CONF_IS_ON_JOIN, CONF_INVERTED
+from . import get_hub, unique_id_prefix
 
 _LOGGER = logging.getLogger(__name__)
 
 PLATFORM_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_NAME): cv.string,
+        vol.Optional(CONF_HUB): cv.slug,
         vol.Required(CONF_IS_ON_JOIN): cv.positive_int,           
         vol.Required(CONF_DEVICE_CLASS): cv.string,
         vol.Optional(CONF_INVERTED, default=False): cv.boolean,
@@ -22,7 +24,9 @@ PLATFORM_SCHEMA = vol.Schema(
 )
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
-    hub = hass.data[DOMAIN][HUB]
+    hub = get_hub(hass, config)
+    if hub is None:
+        return
     entity = [CrestronBinarySensor(hub, config)]
     async_add_entities(entity)
 
@@ -30,6 +34,7 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
 class CrestronBinarySensor(Entity):
     def __init__(self, hub, config):
         self._hub = hub
+        self._unique_id_prefix = unique_id_prefix(config)
         self._name = config.get(CONF_NAME)
         self._join = config.get(CONF_IS_ON_JOIN)
         self._device_class = config.get(CONF_DEVICE_CLASS)
@@ -37,9 +42,11 @@ class CrestronBinarySensor(Entity):
 
     async def async_added_to_hass(self):
         self._hub.register_callback(self.process_callback)
+        self._hub.register_availability_callback(self.async_write_ha_state)
 
     async def async_will_remove_from_hass(self):
         self._hub.remove_callback(self.process_callback)
+        self._hub.remove_availability_callback(self.async_write_ha_state)
 
     async def process_callback(self, cbtype, value):
         self.async_write_ha_state()
@@ -54,7 +61,7 @@ class CrestronBinarySensor(Entity):
 
     @property
     def unique_id(self):
-        return 'binary-sensor-' + str(self._join)
+        return self._unique_id_prefix + 'binary-sensor-' + str(self._join)
 
     @property
     def device_class(self):
@@ -7,13 +7,16 @@ import asyncio
 import homeassistant.helpers.config_validation as cv
 from homeassistant.components.button import ButtonEntity
 from homeassistant.const import CONF_NAME
-from .const import HUB, DOMAIN, CONF_BUTTON_JOIN
+from .const import CONF_HUB, CONF_BUTTON_JOIN
+from . import get_hub, unique_id_prefix
+from .crestron import PRIORITY_HIGH
 
 _LOGGER = logging.getLogger(__name__)
 
 PLATFORM_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_NAME): cv.string,
+        vol.Optional(CONF_HUB): cv.slug,
         vol.Required(CONF_BUTTON_JOIN): cv.positive_int,
     },
     extra=vol.ALLOW_EXTRA,
@@ -21,7 +24,9 @@ PLATFORM_SCHEMA = vol.Schema(
 
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
-    hub = hass.data[DOMAIN][HUB]
+    hub = get_hub(hass, config)
+    if hub is None:
+        return
     entity = [CrestronButton(hub, config)]
     async_add_entities(entity)
 
@@ -29,14 +34,17 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
 class CrestronButton(ButtonEntity):
     def __init__(self, hub, config):
         self._hub = hub
+        self._unique_id_prefix = unique_id_prefix(config)
         self._name = config.get(CONF_NAME)
         self._button_join = config.get(CONF_BUTTON_JOIN)
 
     async def async_added_to_hass(self):
         self._hub.register_callback(self.process_callback)
+        self._hub.register_availability_callback(self.async_write_ha_state)
 
     async def async_will_remove_from_hass(self):
         self._hub.remove_callback(self.process_callback)
+        self._hub.remove_availability_callback(self.async_write_ha_state)
 
     async def process_callback(self, cbtype, value):
         self.async_write_ha_state()
@@ -51,7 +59,7 @@ class CrestronButton(ButtonEntity):
 
     @property
     def unique_id(self):
-        return 'button-' + str(self._button_join)
+        return self._unique_id_prefix + 'button-' + str(self._button_join)
 
     @property
     def should_poll(self):
@@ -59,6 +67,6 @@ class CrestronButton(ButtonEntity):
 
     async def async_press(self):
         # In Crestron, button presses are modelled by triggering a signal pulse on a digital join
-        self._hub.set_digital(self._button_join, True)
+        self._hub.set_digital(self._button_join, True, PRIORITY_HIGH)
         await asyncio.sleep(0.2)
-        self._hub.set_digital(self._button_join, False)
+        self._hub.set_digital(self._button_join, False, PRIORITY_HIGH)
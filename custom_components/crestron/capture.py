@@ -0,0 +1,72 @@
+"""Record raw XSIG traffic to (and read it back from) compact capture files"""
+
+import struct
+import time
+
+MAGIC = b"XSIGCAP1"
+DIRECTION_IN = 0
+DIRECTION_OUT = 1
+
+# Capture file = MAGIC + header, then one record per socket read/write:
+#   direction (1 byte), microseconds since previous record (4 bytes), length (2 bytes), payload
+_HEADER = struct.Struct("<d")
+_RECORD = struct.Struct("<BIH")
+_MAX_DELTA = 0xFFFFFFFF
+_MAX_PAYLOAD = 0xFFFF
+
+
+class CaptureWriter:
+    """Buffers records in memory.  Only write() touches the disk, so call it from an executor.
+
+    An existing file at path is replaced: a second header in the middle of a file would be
+    read back as a record.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._buffer = bytearray(MAGIC + _HEADER.pack(time.time()))
+        self._last = time.monotonic_ns()
+        self._mode = "wb"
+        self.records = 0
+
+    def record(self, direction, data):
+        """Append one chunk of traffic (called from the event loop)"""
+        now = time.monotonic_ns()
+        delta = min((now - self._last) // 1000, _MAX_DELTA)
+        self._last = now
+        for start in range(0, len(data), _MAX_PAYLOAD):
+            chunk = data[start : start + _MAX_PAYLOAD]
+            self._buffer += _RECORD.pack(direction, delta, len(chunk))
+            self._buffer += chunk
+            delta = 0
+        self.records += 1
+
+    def take(self):
+        """Return buffered bytes not yet written and reset the buffer (event loop side)"""
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+    def write(self, data):
+        """Append bytes returned by take() to the capture file (blocking)"""
+        if data:
+            # The first write (which starts with the header) truncates
+            with open(self.path, self._mode) as f:
+                f.write(data)
+            self._mode = "ab"
+
+
+def read_capture(path):
+    """Yield (seconds since capture start, direction, payload) for each record in a capture file"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[: len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not an XSIG capture file")
+    offset = len(MAGIC) + _HEADER.size
+    elapsed = 0
+    while offset + _RECORD.size <= len(data):
+        direction, delta, length = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        elapsed += delta
+        yield elapsed / 1000000, direction, data[offset : offset + length]
+        offset += length
@@ -34,15 +34,16 @@ from .const import (
     CONF_MODE_OFF_JOIN,
     CONF_PULSED,
     CONF_REG_TEMP_JOIN,
-    DOMAIN,
-    HUB,
+    CONF_HUB,
 )
+from . import get_hub, unique_id_prefix
 
 _LOGGER = logging.getLogger(__name__)
 
 PLATFORM_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_NAME): cv.string,
+        vol.Optional(CONF_HUB): cv.slug,
         vol.Optional(CONF_PULSED): cv.boolean,
         vol.Optional(CONF_HEAT_SP_JOIN): cv.positive_int,
         vol.Optional(CONF_COOL_SP_JOIN): cv.positive_int,
@@ -65,7 +66,9 @@ PLATFORM_SCHEMA = vol.Schema(
 
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
-    hub = hass.data[DOMAIN][HUB]
+    hub = get_hub(hass, config)
+    if hub is None:
+        return
     entity = [CrestronThermostat(hub, config, hass.config.units.temperature_unit)]
     async_add_entities(entity)
 
@@ -73,6 +76,7 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
 class CrestronThermostat(ClimateEntity):
     def __init__(self, hub, config, unit):
         self._hub = hub
+        self._unique_id_prefix = unique_id_prefix(config)
 
         self._pulsed = config.get(CONF_PULSED, False)
         self._divisor = config.get(CONF_DIVISOR, 1)
@@ -134,9 +138,11 @@ class CrestronThermostat(ClimateEntity):
 
     async def async_added_to_hass(self):
         self._hub.register_callback(self.process_callback)
+        self._hub.register_availability_callback(self.async_write_ha_state)
 
     async def async_will_remove_from_hass(self):
         self._hub.remove_callback(self.process_callback)
+        self._hub.remove_availability_callback(self.async_write_ha_state)
 
     async def process_callback(self, cbtype, value):
         self.async_write_ha_state()
@@ -147,7 +153,7 @@ class CrestronThermostat(ClimateEntity):
 
     @property
     def unique_id(self):
-        return "climate-" + str(self.name)
+        return self._unique_id_prefix + "climate-" + str(self.name)
 
     @property
     def name(self):
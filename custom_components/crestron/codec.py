@@ -0,0 +1,145 @@
+"""Encoding and decoding of Crestron XSIG frames
+
+Frame layouts (join numbers are 1-based in the API, 0-based on the wire):
+
+    digital: 10Cjjjjj 0jjjjjjj                    C = complement of the value, 12-bit join
+    analog:  11aa0jjj 0jjjjjjj 0vvvvvvv 0vvvvvvv  aa = value bits 15-14, 10-bit join
+    serial:  11001jjj 0jjjjjjj <utf-8 bytes> FF   10-bit join
+    0xFB:    control system asks for all joins to be resent
+    0xFD:    hub asks the control system to send all of its joins
+"""
+
+DIGITAL = "d"
+ANALOG = "a"
+SERIAL = "s"
+SYNC_ALL = "sync"
+# Serial frames that were skipped: payload not decodable, or no terminator within max_serial
+SERIAL_INVALID = "serial_invalid"
+SERIAL_OVERSIZED = "serial_oversized"
+
+SYNC_ALL_BYTE = 0xFB
+UPDATE_REQUEST = b"\xfd"
+SERIAL_TERMINATOR = b"\xff"
+
+MAX_DIGITAL_JOIN = 4096
+MAX_ANALOG_JOIN = 1024
+MAX_SERIAL_JOIN = 1024
+MAX_ANALOG_VALUE = 0xFFFF
+MAX_SERIAL_LENGTH = 252
+
+
+def encode_digital(join, value):
+    """Return the frame for a digital join"""
+    return bytes(
+        (
+            0b10000000 | (0 if value else 0b00100000) | (join - 1) >> 7,
+            (join - 1) & 0b01111111,
+        )
+    )
+
+
+def encode_analog(join, value):
+    """Return the frame for an analog join (0-65535)"""
+    return bytes(
+        (
+            0b11000000 | (value >> 10 & 0b00110000) | (join - 1) >> 7,
+            (join - 1) & 0b01111111,
+            value >> 7 & 0b01111111,
+            value & 0b01111111,
+        )
+    )
+
+
+def encode_serial(join, data):
+    """Return the frame for a serial join from already-encoded bytes (max 252)"""
+    return (
+        bytes((0b11001000 | (join - 1) >> 7, (join - 1) & 0b01111111))
+        + data
+        + SERIAL_TERMINATOR
+    )
+
+
+def truncate_utf8(data, limit=MAX_SERIAL_LENGTH):
+    """Cut utf-8 bytes to at most limit bytes without splitting a character"""
+    if len(data) <= limit:
+        return data
+    end = limit
+    # data[end] is the first byte cut off: back up while it continues a character
+    while end and data[end] & 0b11000000 == 0b10000000:
+        end -= 1
+    return data[:end]
+
+
+def decode_frame(buffer, offset=0, max_serial=None, encoding="utf-8", errors="strict"):
+    """Decode the frame starting at buffer[offset]
+
+    Returns (kind, join, value, next_offset), or None if the buffer ends before the frame does.
+    kind is DIGITAL (value is a bool), ANALOG (int), SERIAL (str), SYNC_ALL (join and value
+    are None) or None for a byte that does not start a valid frame (it is skipped, value is
+    the offending byte).
+
+    Serial payloads are decoded with encoding/errors straight from the buffer.  A payload that
+    does not decode is skipped whole (SERIAL_INVALID).  With max_serial, a serial frame with no
+    terminator within max_serial bytes is skipped up to its terminator (SERIAL_OVERSIZED), so
+    its payload never turns into frames and never buffers more than max_serial bytes.  If the
+    terminator has not arrived yet, value is True and next_offset is the end of the buffer:
+    the caller drops what follows with skip_serial() until the terminator shows up.
+    """
+    end = len(buffer)
+    if offset >= end:
+        return None
+    first = buffer[offset]
+    if first == SYNC_ALL_BYTE:
+        return SYNC_ALL, None, None, offset + 1
+    if not first & 0b10000000:
+        return None, None, first, offset + 1
+    if offset + 1 >= end:
+        return None
+    second = buffer[offset + 1]
+    if second & 0b10000000:
+        return None, None, first, offset + 1
+    # Digital Join
+    if first & 0b11000000 == 0b10000000:
+        join = ((first & 0b00011111) << 7 | second) + 1
+        return DIGITAL, join, not first & 0b00100000, offset + 2
+    # Analog Join
+    if first & 0b11001000 == 0b11000000:
+        if offset + 3 >= end:
+            return None
+        high = buffer[offset + 2]
+        low = buffer[offset + 3]
+        if (high | low) & 0b10000000:
+            return None, None, first, offset + 1
+        join = ((first & 0b00000111) << 7 | second) + 1
+        value = (first & 0b00110000) << 10 | high << 7 | low
+        return ANALOG, join, value, offset + 4
+    # Serial Join
+    if first & 0b11111000 == 0b11001000:
+        join = ((first & 0b00000111) << 7 | second) + 1
+        start = offset + 2
+        if max_serial is None:
+            terminator = buffer.find(SERIAL_TERMINATOR, start)
+        else:
+            terminator = buffer.find(SERIAL_TERMINATOR, start, start + max_serial + 1)
+        if terminator < 0:
+            if max_serial is not None and end - start > max_serial:
+                terminator = buffer.find(SERIAL_TERMINATOR, start + max_serial + 1)
+                if terminator < 0:
+                    return SERIAL_OVERSIZED, join, True, end
+                return SERIAL_OVERSIZED, join, False, terminator + 1
+            return None
+        with memoryview(buffer) as view:
+            try:
+                string = str(view[start:terminator], encoding, errors)
+            except UnicodeDecodeError:
+                return SERIAL_INVALID, join, None, terminator + 1
+        return SERIAL, join, string, terminator + 1
+    return None, None, first, offset + 1
+
+
+def skip_serial(buffer, offset=0):
+    """Return the offset just past the next serial terminator, None if it has not arrived yet"""
+    terminator = buffer.find(SERIAL_TERMINATOR, offset)
+    if terminator < 0:
+        return None
+    return terminator + 1
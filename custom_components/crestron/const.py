@@ -1,10 +1,58 @@
 HUB = "hub"
+HUBS = "hubs"
 DOMAIN = "crestron"
 CONF_PORT = "port"
 CONF_TO_HUB = "to_joins"
 CONF_FROM_HUB = "from_joins"
 CONF_JOIN = "join"
 CONF_SCRIPT = "script"
+CONF_DIAGNOSTICS = "diagnostics"
+CONF_MODE = "mode"
+CONF_DURATION = "duration"
+CONF_INTERVAL = "interval"
+SERVICE_PROFILE = "profile"
+CONF_FILENAME = "filename"
+SERVICE_CAPTURE_START = "capture_start"
+SERVICE_CAPTURE_STOP = "capture_stop"
+CONF_TRACE_SIZE = "trace_size"
+CONF_COUNT = "count"
+SERVICE_DUMP_TRACE = "dump_trace"
+CONF_SCALE = "scale"
+CONF_OFFSET = "offset"
+CONF_CLAMP = "clamp"
+CONF_MAP = "map"
+CONF_HUB = "hub"
+CONF_MULTI_CONNECTION = "multi_connection"
+CONF_MERGE = "merge"
+CONF_SNAPSHOT = "snapshot"
+CONF_SNAPSHOT_INTERVAL = "snapshot_interval"
+CONF_SNAPSHOT_MMAP = "snapshot_mmap"
+CONF_BULK_LOAD = "bulk_load"
+CONF_BULK_LOAD_QUIET_TIME = "bulk_load_quiet_time"
+CONF_BULK_LOAD_MAX_FRAMES = "bulk_load_max_frames"
+CONF_AVAILABILITY_DELAY = "availability_delay"
+CONF_KEEPALIVE = "keepalive"
+CONF_KEEPALIVE_INTERVAL = "keepalive_interval"
+CONF_KEEPALIVE_COUNT = "keepalive_count"
+CONF_IDLE_TIMEOUT = "idle_timeout"
+CONF_HEARTBEAT_JOIN = "heartbeat_join"
+CONF_HEARTBEAT_INTERVAL = "heartbeat_interval"
+CONF_STANDBY = "standby"
+CONF_OUTBOUND_SCHEDULING = "outbound_scheduling"
+CONF_OUTBOUND_WEIGHTS = "outbound_weights"
+CONF_OUTBOUND_RATE_LIMIT = "outbound_rate_limit"
+CONF_BYTES_PER_SECOND = "bytes_per_second"
+CONF_FRAMES_PER_SECOND = "frames_per_second"
+CONF_BURST_BYTES = "burst_bytes"
+CONF_BURST_FRAMES = "burst_frames"
+CONF_OUTBOUND_DEDUP = "outbound_dedup"
+CONF_RATE_LIMIT = "rate_limit"
+CONF_SERIAL_MAX_LENGTH = "serial_max_length"
+CONF_SERIAL_ENCODING = "serial_encoding"
+CONF_SERIAL_ERRORS = "serial_errors"
+CONF_READ_SLICE_FRAMES = "read_slice_frames"
+CONF_READ_SLICE_TIME = "read_slice_time"
+CONF_INBOUND_CONFLATION = "inbound_conflation"
 CONF_IS_ON_JOIN = "is_on_join"
 CONF_HEAT_SP_JOIN = "heat_sp_join"
 CONF_COOL_SP_JOIN = "cool_sp_join"
@@ -20,8 +20,7 @@ from homeassistant.components.cover import (
 )
 from homeassistant.const import CONF_NAME, CONF_TYPE
 from .const import (
-    HUB,
-    DOMAIN,
+    CONF_HUB,
     CONF_IS_OPENING_JOIN,
     CONF_IS_OPENED_JOIN,
     CONF_IS_CLOSING_JOIN,
@@ -36,14 +35,20 @@ from .const import (
     CONF_UP_SET_JOIN,
     CONF_UP_RESET_JOIN,
     CONF_DOWN_SET_JOIN,
-    CONF_DOWN_RESET_JOIN
+    CONF_DOWN_RESET_JOIN,
+    CONF_SCALE,
+    CONF_OFFSET,
 )
+from . import get_hub, unique_id_prefix
+from .crestron import PRIORITY_HIGH
+from .transform import SCALE_SCHEMA, compile_inverse, compile_transform
 
 _LOGGER = logging.getLogger(__name__)
 
 PLATFORM_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_NAME): cv.string,
+        vol.Optional(CONF_HUB): cv.slug,
         vol.Required(CONF_TYPE): vol.In(["analog_shade", "digital_shade", "digital_curtain", "elevator"]),
         vol.Required(CONF_IS_OPENING_JOIN): cv.positive_int,
         vol.Required(CONF_IS_CLOSING_JOIN): cv.positive_int,
@@ -55,13 +60,18 @@ PLATFORM_SCHEMA = vol.Schema(
         vol.Optional(CONF_OPEN_FULL_JOIN): cv.positive_int,
         vol.Optional(CONF_CLOSE_FULL_JOIN): cv.positive_int,
         vol.Optional(CONF_MAIN_ENGINE_JOIN): cv.positive_int,
-        vol.Optional(CONF_IR_SENSOR_JOIN): cv.positive_int
+        vol.Optional(CONF_IR_SENSOR_JOIN): cv.positive_int,
+        # pos_join value * scale + offset = HA position (0-100)
+        vol.Optional(CONF_SCALE, default=1 / 655.35): SCALE_SCHEMA,
+        vol.Optional(CONF_OFFSET, default=0): vol.Coerce(float),
     },
     extra=vol.ALLOW_EXTRA,
 )
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
-    hub = hass.data[DOMAIN][HUB]
+    hub = get_hub(hass, config)
+    if hub is None:
+        return
     if config.get(CONF_TYPE) == 'elevator':
         # Elevators can be modeled as covers but their implementation
         # is much different than other shades hence they have their own class
@@ -73,6 +83,7 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
 class CrestronShade(CoverEntity):
     def __init__(self, hub, config):
         self._hub = hub
+        self._unique_id_prefix = unique_id_prefix(config)
         self._type = config.get(CONF_TYPE)
         if (self._type == "analog_shade"):
             self._digital = False
@@ -82,6 +93,10 @@ class CrestronShade(CoverEntity):
             )
             self._is_closed_join = config.get(CONF_IS_CLOSED_JOIN)
             self._pos_join = config.get(CONF_POS_JOIN)
+            scale = config.get(CONF_SCALE, 1 / 655.35)
+            offset = config.get(CONF_OFFSET, 0)
+            self._to_position = compile_transform(scale, offset, (0, 100))
+            self._to_analog = compile_inverse(scale, offset, (0, 65535))
         elif (self._type == "digital_shade"):
             self._digital = True
             self._device_class = DEVICE_CLASS_SHADE
@@ -111,16 +126,18 @@ class CrestronShade(CoverEntity):
 
     async def async_added_to_hass(self):
         self._hub.register_callback(self.process_callback)
+        self._hub.register_availability_callback(self.async_write_ha_state)
 
     async def async_will_remove_from_hass(self):
         self._hub.remove_callback(self.process_callback)
+        self._hub.remove_availability_callback(self.async_write_ha_state)
 
     async def process_callback(self, cbtype, value):
         self.async_write_ha_state()
 
     @property
     def unique_id(self):
-       return 'cover-' + str(self._is_opening_join) + str(self._is_closing_join)
+       return self._unique_id_prefix + 'cover-' + str(self._is_opening_join) + str(self._is_closing_join)
        
     @property
     def available(self):
@@ -145,7 +162,7 @@ class CrestronShade(CoverEntity):
     @property
     def current_cover_position(self):
         if not self._digital:
-            return self._hub.get_analog(self._pos_join) / 655.35
+            return self._to_position(self._hub.get_analog(self._pos_join))
 
     @property
     def is_opening(self):
@@ -173,7 +190,7 @@ class CrestronShade(CoverEntity):
 
     async def async_set_cover_position(self, **kwargs):
         if not self._digital:
-            self._hub.set_analog(self._pos_join, int(kwargs["position"]) * 655)
+            self._hub.set_analog(self._pos_join, self._to_analog(kwargs["position"]))
             self._manual_stop = False
 
     async def async_open_cover(self, **kwargs):
@@ -196,13 +213,14 @@ class CrestronShade(CoverEntity):
 
     async def async_stop_cover(self, **kwargs):
         self._manual_stop = True
-        self._hub.set_digital(self._stop_join, 1)
+        self._hub.set_digital(self._stop_join, 1, PRIORITY_HIGH)
         await asyncio.sleep(0.2)
-        self._hub.set_digital(self._stop_join, 0)
+        self._hub.set_digital(self._stop_join, 0, PRIORITY_HIGH)
 
 class CrestronElevator(CoverEntity):
     def __init__(self, hub, config):
         self._hub = hub
+        self._unique_id_prefix = unique_id_prefix(config)
         self._type = config.get(CONF_TYPE)
         self._supported_features = (
             SUPPORT_OPEN | SUPPORT_CLOSE | SUPPORT_STOP
@@ -235,16 +253,18 @@ class CrestronElevator(CoverEntity):
 
     async def async_added_to_hass(self):
         self._hub.register_callback(self.process_callback)
+        self._hub.register_availability_callback(self.async_write_ha_state)
 
     async def async_will_remove_from_hass(self):
         self._hub.remove_callback(self.process_callback)
+        self._hub.remove_availability_callback(self.async_write_ha_state)
 
     async def process_callback(self, cbtype, value):
         self.async_write_ha_state()
 
     @property
     def unique_id(self):
-       return 'elevator-' + str(self._is_opening_join) + str(self._is_closing_join)
+       return self._unique_id_prefix + 'elevator-' + str(self._is_opening_join) + str(self._is_closing_join)
        
     @property
     def available(self):
@@ -347,18 +367,18 @@ class CrestronElevator(CoverEntity):
     async def async_stop_cover(self, **kwargs):
         if self._hub.get_digital(self._main_engine_join):
             # Turn off engine
-            self._hub.set_digital(self._main_engine_join, 1)
+            self._hub.set_digital(self._main_engine_join, 1, PRIORITY_HIGH)
             await asyncio.sleep(0.05)
-            self._hub.set_digital(self._main_engine_join, 0)
+            self._hub.set_digital(self._main_engine_join, 0, PRIORITY_HIGH)
         # Check if UP is OFF
         if self._hub.get_digital(self._is_opening_join):
             # RESET UP
-            self._hub.set_digital(self._up_reset_join, 1)
+            self._hub.set_digital(self._up_reset_join, 1, PRIORITY_HIGH)
             await asyncio.sleep(0.05)
-            self._hub.set_digital(self._up_reset_join, 0)
+            self._hub.set_digital(self._up_reset_join, 0, PRIORITY_HIGH)
         # Check if DOWN is OFF
         if self._hub.get_digital(self._is_closing_join):
             # RESET DOWN
-            self._hub.set_digital(self._down_reset_join, 1)
+            self._hub.set_digital(self._down_reset_join, 1, PRIORITY_HIGH)
             await asyncio.sleep(0.05)
-            self._hub.set_digital(self._down_reset_join, 0)
+            self._hub.set_digital(self._down_reset_join, 0, PRIORITY_HIGH)
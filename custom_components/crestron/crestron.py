@@ -1,34 +1,313 @@
 import asyncio
-import struct
 import logging
+import socket
+import time
+from collections import deque
+
+from .capture import DIRECTION_IN, DIRECTION_OUT
+from .codec import (
+    ANALOG,
+    DIGITAL,
+    SERIAL,
+    SYNC_ALL,
+    SERIAL_INVALID,
+    SERIAL_OVERSIZED,
+    MAX_SERIAL_LENGTH,
+    UPDATE_REQUEST,
+    decode_frame,
+    encode_analog,
+    encode_digital,
+    encode_serial,
+    skip_serial,
+    truncate_utf8,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+READ_SIZE = 4096
+# Cooperative time-slicing of the read loop: yield to the event loop after this many frames
+# or seconds of uninterrupted decoding/dispatch
+DEFAULT_SLICE_FRAMES = 200
+DEFAULT_SLICE_TIME = 0.01
+# A read that took longer than this (s) waited for data instead of returning buffered data
+SLICE_READ_WAIT = 0.001
+# With inbound conflation, the read loop waits (TCP backpressure) while this many digital
+# edges are waiting to be dispatched
+MAX_PENDING_EDGES = 1000
+# Longest serial payload (bytes) accepted from the control system before resyncing
+DEFAULT_MAX_SERIAL = 1024
+DEFAULT_TRACE_SIZE = 1000
+
+# Inbound merge policies with several connections on one hub
+MERGE_LAST = "last"  # every connection updates joins, the most recent frame wins
+MERGE_FIRST = "first"  # only the oldest connection updates joins, the rest are taps
+
+# Outbound priority lanes, used once an output's write buffer is backed up
+PRIORITY_HIGH = 0  # interactive and safety commands (buttons, switches, shade stop)
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2  # replication: to_joins, resyncs, light transitions
+SCHEDULING_STRICT = "strict"  # always empty the highest non-empty lane first
+SCHEDULING_WEIGHTED = "weighted"  # share the link by lane weights, bulk never starves
+DEFAULT_WEIGHTS = (8, 4, 1)
+# Write buffer size (bytes) above which outbound frames wait in their lanes
+OUTBOUND_HIGH_WATER = 4096
+
+
+class Pacer:
+    """Token buckets limiting outbound bytes and/or frames per second"""
+
+    def __init__(
+        self, bytes_per_second=None, frames_per_second=None, burst_bytes=None, burst_frames=None
+    ):
+        # Each bucket is [rate, capacity, tokens]; a burst defaults to 1/10 s of traffic
+        self._buckets = []
+        self._sizes = []
+        if bytes_per_second is not None:
+            capacity = burst_bytes or max(bytes_per_second / 10, 255)
+            self._buckets.append([bytes_per_second, capacity, capacity])
+            self._sizes.append(True)
+        if frames_per_second is not None:
+            capacity = burst_frames or max(frames_per_second / 10, 1)
+            self._buckets.append([frames_per_second, capacity, capacity])
+            self._sizes.append(False)
+        self._stamp = time.monotonic()
+
+    def delay(self, size):
+        """Take the tokens for a size byte frame and return 0, or the seconds until they are there"""
+        now = time.monotonic()
+        elapsed = now - self._stamp
+        self._stamp = now
+        wait = 0.0
+        for bucket, in_bytes in zip(self._buckets, self._sizes):
+            rate, capacity, tokens = bucket
+            tokens = min(capacity, tokens + elapsed * rate)
+            bucket[2] = tokens
+            # A frame larger than the burst goes out once the bucket is full
+            needed = min(size if in_bytes else 1, capacity)
+            if tokens < needed:
+                wait = max(wait, (needed - tokens) / rate)
+        if wait:
+            return wait
+        for bucket, in_bytes in zip(self._buckets, self._sizes):
+            bucket[2] -= size if in_bytes else 1
+        return 0
+
+
+def format_trace(trace):
+    """Format get_trace() entries as text lines, timed relative to the newest entry"""
+    if not trace:
+        return []
+    newest = trace[-1][0]
+    lines = []
+    for timestamp, direction, kind, join, value in trace:
+        arrow = "in " if direction == DIRECTION_IN else "out"
+        if kind in (DIGITAL, ANALOG, SERIAL):
+            frame = f"{kind}{join} = {value!r}"
+        elif kind == SYNC_ALL:
+            frame = "update all joins request"
+        elif kind == SERIAL_INVALID:
+            frame = f"{SERIAL}{join} not decodable, skipped"
+        elif kind == SERIAL_OVERSIZED:
+            frame = f"{SERIAL}{join} over the length limit, skipped"
+        else:
+            frame = f"unknown byte {value:02x}"
+        lines.append(f"{timestamp - newest:+.6f} {arrow} {frame}")
+    return lines
+
 
 class CrestronXsig:
-    def __init__(self):
-        """Initialize CrestronXsig object"""
+    def __init__(
+        self,
+        trace_size=DEFAULT_TRACE_SIZE,
+        multi_connection=False,
+        merge=MERGE_LAST,
+        bulk_quiet_time=None,
+        bulk_max_frames=None,
+        availability_delay=0,
+        keepalive=None,
+        idle_timeout=None,
+        heartbeat_join=None,
+        heartbeat_interval=None,
+        standby=False,
+        scheduling=SCHEDULING_STRICT,
+        weights=DEFAULT_WEIGHTS,
+        pacer=None,
+        dedup=True,
+        max_serial=DEFAULT_MAX_SERIAL,
+        serial_encoding="utf-8",
+        serial_errors="replace",
+        slice_frames=DEFAULT_SLICE_FRAMES,
+        slice_time=DEFAULT_SLICE_TIME,
+        conflate=False,
+    ):
+        """Initialize CrestronXsig object
+
+        With bulk_quiet_time set, the join dump after a connect only fills the store: the hub
+        becomes available (one dispatch) once no data arrived for bulk_quiet_time seconds or
+        bulk_max_frames frames were received.
+
+        With availability_delay set, a lost connection is only announced if it is not back
+        within availability_delay seconds.
+
+        keepalive is (idle, interval, count) for TCP keepalive on each connection.  With
+        idle_timeout set, a connection that sent nothing for idle_timeout seconds is aborted.
+        heartbeat_join is a digital join toggled every heartbeat_interval seconds; a control
+        system program that loops it back keeps an otherwise quiet connection from timing out
+        (its frames update the store but are not dispatched).
+
+        With standby, the first connection is the primary and later ones are hot standbys:
+        they get their own join store and no outbound joins.  When the primary is lost the
+        oldest standby is promoted, its joins become the hub's joins and all to_joins are
+        pushed to it as bulk traffic, without the hub becoming unavailable.
+
+        Outbound frames go straight to the socket until an output's write buffer passes
+        OUTBOUND_HIGH_WATER.  From then on they wait in one lane per priority and are sent as
+        the buffer drains: strictly by priority, or with weighted scheduling interleaved by
+        weights (high, normal, bulk).  A resync goes into the bulk lane frame by frame, so
+        at most OUTBOUND_HIGH_WATER bytes of it are ahead of a later high priority frame.
+
+        pacer (a Pacer) limits the outbound rate: frames that find the token buckets empty
+        wait in their lanes.
+
+        With dedup, a join is not sent again with the value last sent for it unless forced
+        (force=True or a resync).  An inbound frame with a different value for the same join
+        forgets the sent value, so the next write goes out again.
+
+        Inbound serial payloads are decoded with serial_encoding/serial_errors.  A payload that
+        does not decode, or a serial header with no terminator within max_serial bytes, is
+        skipped and counted instead of closing the connection.
+
+        The read loop yields to the event loop after slice_frames frames or slice_time seconds
+        without a pause, so a large join dump does not hold up the rest of Home Assistant.
+
+        With conflate, the read loop does not dispatch join changes itself: analog and serial
+        changes go to a per-join mailbox holding only the latest value, digital edges to a
+        queue, and a separate task dispatches them.  When callbacks fall behind, intermediate
+        analog/serial values are dropped while every digital edge is still dispatched in order.
+        """
         self._digital = {}
         self._analog = {}
         self._serial = {}
-        self._writer = None
+        # Connected writers -> monotonic connect time, oldest first
+        self._connections = {}
+        # Writers that outbound joins go to
+        self._outputs = []
+        self._multi_connection = multi_connection
+        self._standby = standby
+        self._primary = None
+        # Standby writer -> its own (digital, analog, serial) join dicts
+        self._standby_stores = {}
+        # True while the sync callback runs: its frames are sent as bulk traffic
+        self._resyncing = False
+        # One deque of encoded frames per priority, filled while the outputs are backed up
+        self._lanes = (deque(), deque(), deque())
+        if scheduling == SCHEDULING_WEIGHTED:
+            self._schedule = [
+                lane for lane, weight in enumerate(weights) for _ in range(weight)
+            ]
+        else:
+            self._schedule = []
+        self._schedule_pos = 0
+        self._congested = False
+        self._flush_task = None
+        self._pacer = pacer
+        self._dedup = dedup
+        self._max_serial = max_serial
+        self._serial_encoding = serial_encoding
+        self._serial_errors = serial_errors
+        self._slice_frames = slice_frames
+        # cbtype -> latest undispatched analog/serial value (None: conflation is off)
+        self._mailbox = {} if conflate else None
+        # Undispatched digital edges as (cbtype, value), oldest first
+        self._edges = deque()
+        self._mail = asyncio.Event()
+        self._edges_space = asyncio.Event()
+        self._mail_task = None
+        self._slice_time = slice_time
+        # Last value sent per join, by kind
+        self._sent = {DIGITAL: {}, ANALOG: {}, SERIAL: {}}
+        # Serial join -> (string, encoded frame) of the last string sent
+        self._serial_frames = {}
+        # True while a resync runs: every join is sent
+        self._force_all = False
+        # Single-flight "update all joins" (0xFB) job, and whether another pass is wanted
+        self._sync_task = None
+        self._sync_again = False
+        self._merge = merge
+        # (kind, join) restored from a snapshot and not yet confirmed by the control system
+        self._restored = set()
+        self._bulk_quiet_time = bulk_quiet_time
+        self._bulk_max_frames = bulk_max_frames
+        self._bulk = False
+        self._bulk_frames = 0
+        self._bulk_started = None
+        self._bulk_timer = None
+        self._bulk_task = None
         self._callbacks = set()
+        # Plain (non-async) callbacks, called in one pass when availability changes
+        self._availability_callbacks = set()
+        self._availability_delay = availability_delay
+        self._unavailable_timer = None
+        self._keepalive = keepalive
+        self._idle_timeout = idle_timeout
+        self._heartbeat_join = heartbeat_join
+        self._heartbeat_interval = heartbeat_interval
+        self._heartbeat_timer = None
+        self._heartbeat_value = False
         self._server = None
         self._available = False
         self._sync_all_joins_callback = None
+        self._capture = None
+        # Recent frames as (monotonic time, direction, kind, join, value)
+        self._trace = deque(maxlen=trace_size)
+        # Throughput/health counters (read via get_stats)
+        self._frames_in = {DIGITAL: 0, ANALOG: 0, SERIAL: 0}
+        self._frames_out = {DIGITAL: 0, ANALOG: 0, SERIAL: 0}
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._unknown_packets = 0
+        self._resync_requests = 0
+        self._resyncs_merged = 0
+        self._idle_timeouts = 0
+        self._failovers = 0
+        self._throttle_waits = 0
+        self._suppressed = 0
+        self._bad_serials = 0
+        self._throttle_time = 0.0
+        self._dispatch_count = 0
+        self._dispatch_time = 0.0
+        self._dispatch_time_max = 0.0
+        self._read_yields = 0
+        self._read_block_max = 0.0
+        self._conflated = 0
 
     async def listen(self, port):
         """Start TCP XSIG server listening on configured port"""
         server = await asyncio.start_server(self.handle_connection, "0.0.0.0", port)
         self._server = server
         addr = server.sockets[0].getsockname()
-        _LOGGER.info(f"Listening on {addr}:{port}")
+        _LOGGER.info("Listening on %s:%s", addr, port)
+        if self._mailbox is not None:
+            self._mail_task = asyncio.get_running_loop().create_task(self._drain_mailbox())
+        if self._heartbeat_join is not None:
+            self._heartbeat_timer = asyncio.get_running_loop().call_later(
+                self._heartbeat_interval, self._heartbeat
+            )
 
     async def stop(self):
         """Stop TCP XSIG server"""
-        self._available = False
-        for callback in self._callbacks:
-            await callback("available", "False")
+        if self._heartbeat_timer is not None:
+            self._heartbeat_timer.cancel()
+            self._heartbeat_timer = None
+        self._cancel_bulk()
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            self._sync_task = None
+        if self._mail_task is not None:
+            self._mail_task.cancel()
+            self._mail_task = None
+        self._clear_lanes()
+        self._set_available(False, immediate=True)
         _LOGGER.info("Stop called. Closing connection")
         self._server.close()
 
@@ -45,77 +324,687 @@ class CrestronXsig:
         """Allow callbacks to be de-registered"""
         self._callbacks.discard(callback)
 
+    def register_availability_callback(self, callback):
+        """Allow plain callbacks to be registered for when the hub becomes (un)available"""
+        self._availability_callbacks.add(callback)
+
+    def remove_availability_callback(self, callback):
+        """Allow availability callbacks to be de-registered"""
+        self._availability_callbacks.discard(callback)
+
+    def _set_available(self, available, immediate=False):
+        """Announce an availability change to every availability callback in one pass"""
+        if available:
+            if self._unavailable_timer is not None:
+                # Back within the availability delay: nothing to announce
+                self._unavailable_timer.cancel()
+                self._unavailable_timer = None
+            if self._available:
+                return
+        else:
+            if not self._available:
+                return
+            if self._availability_delay and not immediate:
+                if self._unavailable_timer is None:
+                    self._unavailable_timer = asyncio.get_running_loop().call_later(
+                        self._availability_delay, self._availability_delay_expired
+                    )
+                return
+            if self._unavailable_timer is not None:
+                self._unavailable_timer.cancel()
+                self._unavailable_timer = None
+        self._available = available
+        _LOGGER.debug("Hub available: %s", available)
+        self._refresh_entities()
+
+    def _refresh_entities(self):
+        """Call every availability callback, so each entity writes its state once"""
+        for callback in list(self._availability_callbacks):
+            callback()
+
+    def _availability_delay_expired(self):
+        self._unavailable_timer = None
+        if not self._connections:
+            self._set_available(False, immediate=True)
+
+    async def _dispatch(self, cbtype, value):
+        """Call all registered callbacks, timing the fan-out"""
+        start = time.perf_counter()
+        for callback in self._callbacks:
+            await callback(cbtype, value)
+        elapsed = time.perf_counter() - start
+        self._dispatch_count += 1
+        self._dispatch_time += elapsed
+        if elapsed > self._dispatch_time_max:
+            self._dispatch_time_max = elapsed
+
+    def _post(self, cbtype, value):
+        """Leave the latest value of an analog/serial join in the mailbox"""
+        mailbox = self._mailbox
+        if cbtype in mailbox:
+            self._conflated += 1
+        mailbox[cbtype] = value
+        self._mail.set()
+
+    async def _post_edge(self, cbtype, value):
+        """Queue a digital edge, waiting for the dispatcher while too many are queued"""
+        while len(self._edges) >= MAX_PENDING_EDGES:
+            self._edges_space.clear()
+            await self._edges_space.wait()
+        self._edges.append((cbtype, value))
+        self._mail.set()
+
+    async def _drain_mailbox(self):
+        """Dispatch queued digital edges in order, then the latest analog/serial values"""
+        while True:
+            await self._mail.wait()
+            self._mail.clear()
+            while self._edges or self._mailbox:
+                while self._edges:
+                    await self._dispatch_logged(*self._edges.popleft())
+                self._edges_space.set()
+                mailbox = self._mailbox
+                self._mailbox = {}
+                for cbtype, value in mailbox.items():
+                    await self._dispatch_logged(cbtype, value)
+
+    async def _dispatch_logged(self, cbtype, value):
+        """_dispatch for the mailbox task, which must outlive a failing callback"""
+        try:
+            await self._dispatch(cbtype, value)
+        except Exception:
+            _LOGGER.exception("Error dispatching %s = %s", cbtype, value)
+
+    def start_capture(self, capture):
+        """Record raw traffic in both directions to a CaptureWriter"""
+        self._capture = capture
+
+    def stop_capture(self):
+        """Stop recording traffic and return the CaptureWriter (if any)"""
+        capture = self._capture
+        self._capture = None
+        return capture
+
+    def _heartbeat(self):
+        """Toggle the heartbeat join on every connection"""
+        if self._connections:
+            self._heartbeat_value = not self._heartbeat_value
+            # Standbys too, so their idle timeout works
+            self._write(
+                encode_digital(self._heartbeat_join, self._heartbeat_value),
+                DIGITAL,
+                self._heartbeat_join,
+                self._heartbeat_value,
+                self._connections,
+            )
+        self._heartbeat_timer = asyncio.get_running_loop().call_later(
+            self._heartbeat_interval, self._heartbeat
+        )
+
+    def _set_keepalive(self, writer):
+        """Enable TCP keepalive with the configured (idle, interval, count)"""
+        sock = writer.get_extra_info("socket")
+        if sock is None:
+            return
+        idle, interval, count = self._keepalive
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # Not every platform has the per-socket timing options
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle)
+        elif hasattr(socket, "TCP_KEEPALIVE"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, idle)
+        if hasattr(socket, "TCP_KEEPINTVL"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, interval)
+        if hasattr(socket, "TCP_KEEPCNT"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, count)
+
+    def get_store(self):
+        """Return the digital, analog and serial join dicts (not copies)"""
+        return self._digital, self._analog, self._serial
+
+    def restore(self, digital, analog, serial):
+        """Pre-populate the join store (e.g. from a snapshot) without dispatching
+
+        The first frame for each restored join only dispatches if its value differs.
+        """
+        self._digital.update(digital)
+        self._analog.update(analog)
+        self._serial.update(serial)
+        self._restored.update((DIGITAL, join) for join in digital)
+        self._restored.update((ANALOG, join) for join in analog)
+        self._restored.update((SERIAL, join) for join in serial)
+
+    def _unchanged_restore(self, kind, join, value, store):
+        """True for the first real frame of a restored join when it matches the store"""
+        key = (kind, join)
+        if key not in self._restored:
+            return False
+        self._restored.discard(key)
+        return store.get(join) == value
+
+    def _start_bulk(self):
+        """Start collecting the connect-time join dump without dispatching"""
+        self._bulk = True
+        self._bulk_frames = 0
+        self._bulk_started = time.monotonic()
+        self._schedule_bulk_end()
+
+    def _schedule_bulk_end(self):
+        """(Re)start the quiet timer that ends the bulk load"""
+        if self._bulk_timer is not None:
+            self._bulk_timer.cancel()
+        self._bulk_timer = asyncio.get_running_loop().call_later(
+            self._bulk_quiet_time, self._bulk_quiet
+        )
+
+    def _bulk_quiet(self):
+        self._bulk_timer = None
+        self._bulk_task = asyncio.get_running_loop().create_task(self._end_bulk())
+
+    def _cancel_bulk(self):
+        self._bulk = False
+        if self._bulk_timer is not None:
+            self._bulk_timer.cancel()
+            self._bulk_timer = None
+
+    async def _end_bulk(self):
+        """Bulk load done: become available, so every entity writes its state once"""
+        if not self._bulk:
+            return
+        self._cancel_bulk()
+        _LOGGER.info(
+            "Initial join dump: %s frames in %.3fs",
+            self._bulk_frames,
+            time.monotonic() - self._bulk_started,
+        )
+        self._set_available(True)
+
+    def get_trace(self, count=None):
+        """Return the most recent frames (oldest first) as (time, direction, kind, join, value)"""
+        trace = list(self._trace)
+        if count is not None:
+            trace = trace[-count:]
+        return trace
+
+    def _unchanged(self, kind, join, value, force):
+        """Return True (and count it) if value is the value last sent for the join"""
+        if not self._dedup:
+            return False
+        sent = self._sent[kind]
+        if not (force or self._force_all) and join in sent and sent[join] == value:
+            self._suppressed += 1
+            return True
+        sent[join] = value
+        return False
+
+    def _write(self, data, kind, join, value, writers=None, priority=PRIORITY_NORMAL):
+        """Send an encoded frame to every output connection (or write it to writers)"""
+        if writers is not None:
+            for writer in writers:
+                writer.write(data)
+            if self._capture is not None:
+                self._capture.record(DIRECTION_OUT, data)
+        else:
+            self._send(data, PRIORITY_BULK if self._resyncing else priority)
+        self._trace.append((time.monotonic(), DIRECTION_OUT, kind, join, value))
+        self._frames_out[kind] += 1
+        self._bytes_out += len(data)
+
+    def _send(self, data, priority):
+        """Write data to the outputs, or queue it in its lane while they are backed up"""
+        if self._congested:
+            self._lanes[priority].append(data)
+            return
+        if self._pacer is not None and self._pacer.delay(len(data)):
+            self._lanes[priority].append(data)
+        elif not self._transmit(data):
+            return
+        self._congested = True
+        self._flush_task = asyncio.get_running_loop().create_task(self._flush_lanes())
+
+    def _transmit(self, data):
+        """Write data to every output, return True if one is over the high-water mark"""
+        congested = False
+        for writer in self._outputs:
+            writer.write(data)
+            if writer.transport.get_write_buffer_size() > OUTBOUND_HIGH_WATER:
+                congested = True
+        if self._capture is not None:
+            self._capture.record(DIRECTION_OUT, data)
+        return congested
+
+    def _next_frame(self):
+        """Pop the next queued frame by the lane schedule, None if all lanes are empty"""
+        lanes = self._lanes
+        count = len(self._schedule)
+        for _ in range(count):
+            lane = lanes[self._schedule[self._schedule_pos]]
+            self._schedule_pos = (self._schedule_pos + 1) % count
+            if lane:
+                return lane.popleft()
+        # Strict scheduling (no schedule): highest non-empty lane
+        for lane in lanes:
+            if lane:
+                return lane.popleft()
+        return None
+
+    async def _flush_lanes(self):
+        """Wait for the outputs to drain (and the pacer), then send queued frames until caught up"""
+        pending = None
+        try:
+            while self._congested:
+                for writer in list(self._outputs):
+                    try:
+                        await writer.drain()
+                    except ConnectionError:
+                        pass
+                chunk = bytearray()
+                wait = 0
+                while len(chunk) < OUTBOUND_HIGH_WATER:
+                    if pending is None:
+                        pending = self._next_frame()
+                        if pending is None:
+                            break
+                    if self._pacer is not None:
+                        wait = self._pacer.delay(len(pending))
+                        if wait:
+                            break
+                    chunk += pending
+                    pending = None
+                full = bool(chunk) and self._transmit(chunk)
+                if wait:
+                    self._throttle_waits += 1
+                    self._throttle_time += wait
+                    await asyncio.sleep(wait)
+                else:
+                    self._congested = bool(chunk) and (
+                        full or pending is not None or any(self._lanes)
+                    )
+        finally:
+            if self._flush_task is asyncio.current_task():
+                self._flush_task = None
+
+    def _clear_lanes(self):
+        """Drop queued frames (nothing left to send them to)"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        for lane in self._lanes:
+            lane.clear()
+        self._congested = False
+
+    def _update_outputs(self):
+        if self._standby:
+            self._outputs = [] if self._primary is None else [self._primary]
+        else:
+            self._outputs = list(self._connections)
+
+    async def _sync_all(self):
+        """Run the sync callback with duplicate suppression off: a resync sends every join"""
+        self._force_all = True
+        try:
+            await self._sync_all_joins_callback()
+        finally:
+            self._force_all = False
+
+    async def _push_to_joins(self):
+        """Resend all to_joins (the sync callback) to the outputs as bulk traffic"""
+        if self._sync_all_joins_callback is None:
+            return
+        self._resyncing = True
+        try:
+            await self._sync_all()
+        finally:
+            self._resyncing = False
+
+    def _request_sync(self):
+        """Answer an update all joins request in the background
+
+        Only one resync runs at a time.  Requests that arrive while it runs are merged into a
+        single follow-up pass, so a burst of 0xFB costs at most two resyncs.
+        """
+        if self._sync_task is None:
+            self._sync_task = asyncio.get_running_loop().create_task(self._sync_worker())
+        elif self._sync_again:
+            self._resyncs_merged += 1
+        else:
+            self._sync_again = True
+
+    async def _sync_worker(self):
+        """Resend all to_joins, once more if requested again meanwhile"""
+        try:
+            if self._sync_again:
+                # Requested again before the first pass started: that pass answers it
+                self._resyncs_merged += 1
+            again = True
+            while again:
+                self._sync_again = False
+                _LOGGER.debug("Calling sync-all-joins callback")
+                try:
+                    await self._push_to_joins()
+                except Exception:
+                    _LOGGER.exception("Error resending joins to the control system")
+                again = self._sync_again
+        finally:
+            if self._sync_task is asyncio.current_task():
+                self._sync_task = None
+
+    async def _promote_standby(self):
+        """Make the oldest standby the primary after the primary was lost"""
+        writer, (digital, analog, serial) = next(iter(self._standby_stores.items()))
+        del self._standby_stores[writer]
+        self._primary = writer
+        self._update_outputs()
+        for sent in self._sent.values():
+            sent.clear()
+        self._failovers += 1
+        _LOGGER.warning(
+            "Primary control system lost, promoted standby %s",
+            writer.get_extra_info("peername"),
+        )
+        self._digital.update(digital)
+        self._analog.update(analog)
+        self._serial.update(serial)
+        self._refresh_entities()
+        await self._push_to_joins()
+
+    def _end_slice(self, start, end=None):
+        """Record how long the read loop ran without giving the event loop a turn"""
+        elapsed = (time.perf_counter() if end is None else end) - start
+        if elapsed > self._read_block_max:
+            self._read_block_max = elapsed
+
+    def get_stats(self):
+        """Return a snapshot of the throughput and health counters"""
+        buffered = 0
+        for writer in self._connections:
+            if writer.transport is not None:
+                buffered = max(buffered, writer.transport.get_write_buffer_size())
+        uptime = 0
+        if self._connections:
+            uptime = int(time.monotonic() - next(iter(self._connections.values())))
+        dispatch_avg = 0.0
+        if self._dispatch_count:
+            dispatch_avg = self._dispatch_time / self._dispatch_count
+        return {
+            "frames_in_digital": self._frames_in[DIGITAL],
+            "frames_in_analog": self._frames_in[ANALOG],
+            "frames_in_serial": self._frames_in[SERIAL],
+            "frames_out_digital": self._frames_out[DIGITAL],
+            "frames_out_analog": self._frames_out[ANALOG],
+            "frames_out_serial": self._frames_out[SERIAL],
+            "bytes_in": self._bytes_in,
+            "bytes_out": self._bytes_out,
+            "unknown_packets": self._unknown_packets,
+            "resync_requests": self._resync_requests,
+            "resyncs_merged": self._resyncs_merged,
+            "idle_timeouts": self._idle_timeouts,
+            "failovers": self._failovers,
+            "dispatch_time_avg": round(dispatch_avg * 1000, 3),
+            "dispatch_time_max": round(self._dispatch_time_max * 1000, 3),
+            "read_block_max": round(self._read_block_max * 1000, 3),
+            "read_yields": self._read_yields,
+            "inbound_conflated": self._conflated,
+            "inbound_pending": len(self._edges) + len(self._mailbox or ()),
+            "outbound_buffer": buffered,
+            "outbound_queued": sum(len(lane) for lane in self._lanes),
+            "throttle_waits": self._throttle_waits,
+            "throttle_time": round(self._throttle_time, 3),
+            "outbound_suppressed": self._suppressed,
+            "serial_errors": self._bad_serials,
+            "uptime": uptime,
+            "connections": len(self._connections),
+        }
+
+    def get_connections(self):
+        """Return (peer, seconds connected, is standby) for each connection, oldest first"""
+        now = time.monotonic()
+        return [
+            (writer.get_extra_info("peername"), now - since, writer in self._standby_stores)
+            for writer, since in self._connections.items()
+        ]
+
     async def handle_connection(self, reader, writer):
         """Parse packets from Crestron XSIG symbol"""
-        self._writer = writer
         peer = writer.get_extra_info("peername")
-        _LOGGER.info(f"Control system connection from {peer}")
+        if self._connections and not (self._multi_connection or self._standby):
+            # Without multi_connection the newest connection replaces the old one
+            for old in list(self._connections):
+                _LOGGER.warning(
+                    "Control system connection from %s replaces %s",
+                    peer,
+                    old.get_extra_info("peername"),
+                )
+                del self._connections[old]
+                old.transport.abort()
+        self._connections[writer] = time.monotonic()
+        # drain() then waits for the buffer to drop below OUTBOUND_HIGH_WATER / 4, instead of
+        # letting queued frames pile up to asyncio's default 64 KiB ahead of later ones
+        writer.transport.set_write_buffer_limits(OUTBOUND_HIGH_WATER)
+        # The new connection has not seen any joins yet
+        for sent in self._sent.values():
+            sent.clear()
+        if self._standby:
+            if self._primary is None:
+                self._primary = writer
+            else:
+                self._standby_stores[writer] = ({}, {}, {})
+                _LOGGER.info("Control system %s is a standby", peer)
+        self._update_outputs()
+        if self._keepalive is not None:
+            self._set_keepalive(writer)
+        _LOGGER.info(
+            "Control system connection from %s (%s connected)",
+            peer,
+            len(self._connections),
+        )
         _LOGGER.debug("Sending update request")
-        writer.write(b"\xfd")
-        self._available = True
-        for callback in self._callbacks:
-            await callback("available", "True")
-
-        connected = True
-        while connected:
-            data = await reader.read(1)
-            if data:
-                # Sync all joins request
-                if data[0] == 0xFB:
-                    _LOGGER.debug("Got update all joins request")
-                    if self._sync_all_joins_callback is not None:
-                        await self._sync_all_joins_callback()
-                        _LOGGER.debug("Calling sync-all-joins callback")
-                else:
-                    data += await reader.read(1)
-                    # Digital Join
+        writer.write(UPDATE_REQUEST)
+        self._bytes_out += 1
+        if self._capture is not None:
+            self._capture.record(DIRECTION_OUT, UPDATE_REQUEST)
+        if self._available or self._bulk_quiet_time is None:
+            # Also cancels a pending availability delay after a quick reconnect
+            self._set_available(True)
+        elif not self._bulk:
+            self._start_bulk()
+
+        loop = asyncio.get_running_loop()
+        last_read = loop.time()
+        watchdog = None
+
+        def check_idle():
+            """Abort the connection if nothing was read for idle_timeout seconds"""
+            nonlocal watchdog
+            idle = loop.time() - last_read
+            if idle >= self._idle_timeout:
+                _LOGGER.warning(
+                    "Nothing received from %s for %.1fs, closing connection", peer, idle
+                )
+                self._idle_timeouts += 1
+                watchdog = None
+                # abort, not close: a half-open connection never drains its write buffer
+                writer.transport.abort()
+            else:
+                watchdog = loop.call_later(self._idle_timeout - idle, check_idle)
+
+        if self._idle_timeout is not None:
+            watchdog = loop.call_later(self._idle_timeout, check_idle)
+
+        buffer = bytearray()
+        # Start of the read loop's current run without yielding, and frames handled in it
+        slice_start = None
+        slice_frames = 0
+        # True while dropping the rest of an oversized serial frame up to its terminator
+        skipping = False
+        try:
+            while True:
+                read_start = time.perf_counter()
+                try:
+                    data = await reader.read(READ_SIZE)
+                except OSError as err:
+                    # Also TimeoutError (failed keepalive probes) and EHOSTUNREACH
+                    _LOGGER.info("Connection from %s lost: %s", peer, err)
+                    break
+                if not data:
+                    break
+                last_read = loop.time()
+                now = time.perf_counter()
+                if slice_start is None:
+                    slice_start = now
+                elif now - read_start > SLICE_READ_WAIT:
+                    # The read waited for the network, so the event loop had its turn
+                    self._end_slice(slice_start, read_start)
+                    slice_start = now
+                    slice_frames = 0
+                if self._capture is not None:
+                    self._capture.record(DIRECTION_IN, data)
+                buffer += data
+                offset = 0
+                while True:
+                    if skipping:
+                        next_offset = skip_serial(buffer, offset)
+                        if next_offset is None:
+                            self._bytes_in += len(buffer) - offset
+                            offset = len(buffer)
+                            break
+                        self._bytes_in += next_offset - offset
+                        offset = next_offset
+                        skipping = False
+                    frame = decode_frame(
+                        buffer,
+                        offset,
+                        self._max_serial,
+                        self._serial_encoding,
+                        self._serial_errors,
+                    )
+                    if frame is None:
+                        break
+                    kind, join, value, next_offset = frame
+                    # Looked up per frame: any await below may promote this connection
+                    # With MERGE_FIRST, frames from anything but the oldest connection
+                    # are traced and counted but do not change join values
+                    accept = (
+                        self._merge != MERGE_FIRST
+                        or next(iter(self._connections), None) is writer
+                    )
+                    # A standby's frames only go into its own store
+                    standby = self._standby_stores.get(writer)
+                    self._trace.append(
+                        (time.monotonic(), DIRECTION_IN, kind, join, value)
+                    )
+                    if kind == DIGITAL:
+                        self._frames_in[DIGITAL] += 1
+                        _LOGGER.debug("Got Digital: %s = %d", join, value)
+                        if standby is not None:
+                            standby[0][join] = value
+                        elif accept and not (
+                            self._restored
+                            and self._unchanged_restore(DIGITAL, join, value, self._digital)
+                        ):
+                            self._digital[join] = value
+                            sent = self._sent[DIGITAL]
+                            if join in sent and sent[join] != value:
+                                del sent[join]
+                            if not self._bulk and join != self._heartbeat_join:
+                                if self._mailbox is None:
+                                    await self._dispatch(f"d{join}", "1" if value else "0")
+                                else:
+                                    await self._post_edge(f"d{join}", "1" if value else "0")
+                    elif kind == ANALOG:
+                        self._frames_in[ANALOG] += 1
+                        _LOGGER.debug("Got Analog: %s = %s", join, value)
+                        if standby is not None:
+                            standby[1][join] = value
+                        elif accept and not (
+                            self._restored
+                            and self._unchanged_restore(ANALOG, join, value, self._analog)
+                        ):
+                            self._analog[join] = value
+                            sent = self._sent[ANALOG]
+                            if join in sent and sent[join] != value:
+                                del sent[join]
+                            if not self._bulk:
+                                if self._mailbox is None:
+                                    await self._dispatch(f"a{join}", str(value))
+                                else:
+                                    self._post(f"a{join}", str(value))
+                    elif kind == SERIAL:
+                        self._frames_in[SERIAL] += 1
+                        _LOGGER.debug("Got String: %s = %s", join, value)
+                        if standby is not None:
+                            standby[2][join] = value
+                        elif accept and not (
+                            self._restored
+                            and self._unchanged_restore(SERIAL, join, value, self._serial)
+                        ):
+                            self._serial[join] = value
+                            sent = self._sent[SERIAL]
+                            if join in sent and sent[join] != value:
+                                del sent[join]
+                            if not self._bulk:
+                                if self._mailbox is None:
+                                    await self._dispatch(f"s{join}", value)
+                                else:
+                                    self._post(f"s{join}", value)
+                    elif kind == SERIAL_INVALID or kind == SERIAL_OVERSIZED:
+                        # An oversized frame whose terminator is still to come: drop until it
+                        skipping = value is True
+                        self._bad_serials += 1
+                        _LOGGER.debug("Skipped serial join %s: %s", join, kind)
+                    elif kind == SYNC_ALL:
+                        self._resync_requests += 1
+                        _LOGGER.debug("Got update all joins request")
+                        if standby is None and self._sync_all_joins_callback is not None:
+                            self._request_sync()
+                    else:
+                        self._unknown_packets += 1
+                        _LOGGER.debug("Unknown Packet: %02x", value)
+                    # Counted once handled, so bytes_in never runs ahead of dispatch
+                    self._bytes_in += next_offset - offset
+                    offset = next_offset
+                    if self._bulk:
+                        self._bulk_frames += 1
+                        if self._bulk_frames == self._bulk_max_frames:
+                            await self._end_bulk()
+                    slice_frames += 1
                     if (
-                        data[0] & 0b11000000 == 0b10000000
-                        and data[1] & 0b10000000 == 0b00000000
-                    ):
-                        header = struct.unpack("BB", data)
-                        join = ((header[0] & 0b00011111) << 7 | header[1]) + 1
-                        value = ~header[0] >> 5 & 0b1
-                        self._digital[join] = True if value == 1 else False
-                        _LOGGER.debug(f"Got Digital: {join} = {value}")
-                        for callback in self._callbacks:
-                            await callback(f"d{join}", str(value))
-                    # Analog Join
-                    elif (
-                        data[0] & 0b11001000 == 0b11000000
-                        and data[1] & 0b10000000 == 0b00000000
-                    ):
-                        data += await reader.read(2)
-                        header = struct.unpack("BBBB", data)
-                        join = ((header[0] & 0b00000111) << 7 | header[1]) + 1
-                        value = (
-                            (header[0] & 0b00110000) << 10 | header[2] << 7 | header[3]
-                        )
-                        self._analog[join] = value
-                        _LOGGER.debug(f"Got Analog: {join} = {value}")
-                        for callback in self._callbacks:
-                            await callback(f"a{join}", str(value))
-                    # Serial Join
-                    elif (
-                        data[0] & 0b11111000 == 0b11001000
-                        and data[1] & 0b10000000 == 0b00000000
+                        slice_frames >= self._slice_frames
+                        or time.perf_counter() - slice_start >= self._slice_time
                     ):
-                        data += await reader.readuntil(b"\xff")
-                        header = struct.unpack("BB", data[:2])
-                        join = ((header[0] & 0b00000111) << 7 | header[1]) + 1
-                        string = data[2:-1].decode("utf-8")
-                        self._serial[join] = string
-                        _LOGGER.debug(f"Got String: {join} = {string}")
-                        for callback in self._callbacks:
-                            await callback(f"s{join}", string)
-                    else:
-                        _LOGGER.debug(f"Unknown Packet: {data.hex()}")
-            else:
-                _LOGGER.info("Control system disconnected")
-                connected = False
-                self._available = False
-                for callback in self._callbacks:
-                    await callback("available", "False")
+                        self._end_slice(slice_start)
+                        await asyncio.sleep(0)
+                        self._read_yields += 1
+                        slice_start = time.perf_counter()
+                        slice_frames = 0
+                del buffer[:offset]
+                if self._bulk:
+                    self._schedule_bulk_end()
+        finally:
+            # Runs on EOF, on a socket error and when a callback raised
+            if watchdog is not None:
+                watchdog.cancel()
+            writer.close()
+            self._connections.pop(writer, None)
+            self._standby_stores.pop(writer, None)
+            _LOGGER.info(
+                "Control system %s disconnected (%s connected)",
+                peer,
+                len(self._connections),
+            )
+            if writer is self._primary:
+                self._primary = None
+                if self._standby_stores:
+                    try:
+                        await self._promote_standby()
+                    except Exception:
+                        _LOGGER.exception("Error resending joins to the promoted standby")
+            self._update_outputs()
+            if not self._outputs:
+                self._clear_lanes()
+            if not self._connections:
+                self._cancel_bulk()
+                self._set_available(False)
 
     def is_available(self):
         """Returns True if control system is connected"""
@@ -133,59 +1022,66 @@ class CrestronXsig:
         """Return serial value for join"""
         return self._serial.get(join, "")
 
-    def set_analog(self, join, value):
+    def set_analog(self, join, value, priority=PRIORITY_NORMAL, force=False):
         """Send Analog Join to Crestron XSIG symbol"""
-        if self._writer:
-            data = struct.pack(
-                ">BBBB",
-                0b11000000 | (value >> 10 & 0b00110000) | (join - 1) >> 7,
-                (join - 1) & 0b01111111,
-                value >> 7 & 0b01111111,
-                value & 0b01111111,
-            )
-            self._writer.write(data)
-            _LOGGER.debug(f"Sending Analog: {join}, {value}")
+        if self._outputs:
+            if self._unchanged(ANALOG, join, value, force):
+                return
+            self._write(encode_analog(join, value), ANALOG, join, value, priority=priority)
+            _LOGGER.debug("Sending Analog: %s, %s", join, value)
         else:
             _LOGGER.info("Could not send.  No connection to hub")
 
-    async def set_digital_helper(self, join, value, pulsed=False):
+    async def set_digital_helper(
+        self, join, value, pulsed=False, priority=PRIORITY_NORMAL, force=False
+    ):
         if pulsed:
             # Pulsed switches can only be switched by signal pulses
             # Therefore, must check if switch is not already on
             if (value is True and not self.get_digital(join)) or (
                 value is False and self.get_digital(join)
             ):
-                self.set_digital(join, True)
+                self.set_digital(join, True, priority, force)
                 await asyncio.sleep(0.05)
-                self.set_digital(join, False)
+                self.set_digital(join, False, priority, force)
         else:
-            self.set_digital(join, value=value)
+            self.set_digital(join, value=value, priority=priority, force=force)
 
-    def set_digital(self, join, value):
+    def set_digital(self, join, value, priority=PRIORITY_NORMAL, force=False):
         """Send Digital Join to Crestron XSIG symbol"""
-        if self._writer:
-            data = struct.pack(
-                ">BB",
-                0b10000000 | (~value << 5 & 0b00100000) | (join - 1) >> 7,
-                (join - 1) & 0b01111111,
-            )
-            self._writer.write(data)
-            _LOGGER.debug(f"Sending Digital: {join}, {value}")
+        if self._outputs:
+            if self._unchanged(DIGITAL, join, value, force):
+                return
+            self._write(encode_digital(join, value), DIGITAL, join, value, priority=priority)
+            _LOGGER.debug("Sending Digital: %s, %s", join, value)
         else:
             _LOGGER.info("Could not send.  No connection to hub")
 
-    def set_serial(self, join, string):
-        """Send String Join to Crestron XSIG symbol"""
-        if len(string) > 252:
-            _LOGGER.info(f"Could not send. String too long ({len(string)}>252)")
-            return
-        elif self._writer:
-            data = struct.pack(
-                ">BB", 0b11001000 | ((join - 1) >> 7), (join - 1) & 0b01111111
-            )
-            data += string.encode()
-            data += b"\xff"
-            self._writer.write(data)
-            _LOGGER.debug(f"Sending Serial: {join}, {string}")
+    def set_serial(self, join, string, priority=PRIORITY_NORMAL, force=False):
+        """Send String Join to Crestron XSIG symbol
+
+        Strings over MAX_SERIAL_LENGTH utf-8 bytes are truncated on a character boundary.
+        The encoded frame is kept per join, so resending the same string does not encode again.
+        """
+        if self._outputs:
+            if self._unchanged(SERIAL, join, string, force):
+                return
+            cached = self._serial_frames.get(join)
+            if cached is not None and cached[0] == string:
+                frame = cached[1]
+            else:
+                data = string.encode(errors="replace")
+                if len(data) > MAX_SERIAL_LENGTH:
+                    _LOGGER.info(
+                        "Serial join %s truncated (%s>%s bytes)",
+                        join,
+                        len(data),
+                        MAX_SERIAL_LENGTH,
+                    )
+                    data = truncate_utf8(data)
+                frame = encode_serial(join, data)
+                self._serial_frames[join] = (string, frame)
+            self._write(frame, SERIAL, join, string, priority=priority)
+            _LOGGER.debug("Sending Serial: %s, %s", join, string)
         else:
             _LOGGER.info("Could not send.  No connection to hub")
@@ -15,22 +15,31 @@ from homeassistant.components.light import (
 from homeassistant.const import CONF_NAME, CONF_TYPE
 import homeassistant.helpers.config_validation as cv
 
-from .const import CONF_JOIN, DOMAIN, HUB
+from .const import CONF_JOIN, CONF_SCALE, CONF_OFFSET, CONF_HUB
+from . import get_hub, unique_id_prefix
+from .crestron import PRIORITY_BULK
+from .transform import SCALE_SCHEMA, compile_inverse, compile_transform
 
 _LOGGER = logging.getLogger(__name__)
 
 PLATFORM_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_NAME): cv.string,
+        vol.Optional(CONF_HUB): cv.slug,
         vol.Required(CONF_TYPE): vol.In(["brightness", "onoff"]),
         vol.Required(CONF_JOIN): cv.positive_int,
+        # analog join value * scale + offset = HA brightness (0-255)
+        vol.Optional(CONF_SCALE, default=1 / 255): SCALE_SCHEMA,
+        vol.Optional(CONF_OFFSET, default=0): vol.Coerce(float),
     },
     extra=vol.ALLOW_EXTRA,
 )
 
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
-    hub = hass.data[DOMAIN][HUB]
+    hub = get_hub(hass, config)
+    if hub is None:
+        return
     entity = [CrestronLight(hub, config)]
     async_add_entities(entity)
 
@@ -38,18 +47,25 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
 class CrestronLight(LightEntity):
     def __init__(self, hub, config):
         self._hub = hub
+        self._unique_id_prefix = unique_id_prefix(config)
         self._name = config.get(CONF_NAME)
         self._join = config.get(CONF_JOIN)
         if config.get(CONF_TYPE) == "brightness":
             self._color_mode = ColorMode.BRIGHTNESS
         else:
             self._color_mode = ColorMode.ONOFF
+        scale = config.get(CONF_SCALE, 1 / 255)
+        offset = config.get(CONF_OFFSET, 0)
+        self._to_brightness = compile_transform(scale, offset, (0, 255), as_int=True)
+        self._to_analog = compile_inverse(scale, offset, (0, 65535))
 
     async def async_added_to_hass(self):
         self._hub.register_callback(self.process_callback)
+        self._hub.register_availability_callback(self.async_write_ha_state)
 
     async def async_will_remove_from_hass(self):
         self._hub.remove_callback(self.process_callback)
+        self._hub.remove_availability_callback(self.async_write_ha_state)
 
     async def process_callback(self, cbtype, value):
         self.async_write_ha_state()
@@ -65,9 +81,9 @@ class CrestronLight(LightEntity):
     @property
     def unique_id(self):
         if self._color_mode == ColorMode.BRIGHTNESS:
-            return "light-" + str(self._join)
+            return self._unique_id_prefix + "light-" + str(self._join)
         else:
-            return "toggle-light-" + str(self._join)
+            return self._unique_id_prefix + "toggle-light-" + str(self._join)
 
     @property
     def color_mode(self):
@@ -91,15 +107,12 @@ class CrestronLight(LightEntity):
     @property
     def brightness(self):
         if self._color_mode == ColorMode.BRIGHTNESS:
-            return min(255, int(self._hub.get_analog(self._join) / 255))
+            return self._to_brightness(self._hub.get_analog(self._join))
 
     @property
     def is_on(self):
         if self._color_mode == ColorMode.BRIGHTNESS:
-            if int(self._hub.get_analog(self._join) / 255) > 0:
-                return True
-            else:
-                return False
+            return self._to_brightness(self._hub.get_analog(self._join)) > 0
         elif self._color_mode == ColorMode.ONOFF:
             return self._hub.get_digital(self._join)
 
@@ -116,7 +129,7 @@ class CrestronLight(LightEntity):
                 # If light supports dimming and does not provide a brightness, still transition with 2 seconds
                 await self.__transition(65535, 2)
             else:
-                brightness = int(kwargs[ATTR_BRIGHTNESS] * 255)
+                brightness = self._to_analog(kwargs[ATTR_BRIGHTNESS])
                 if ATTR_TRANSITION not in kwargs:
                     self._hub.set_analog(self._join, brightness)
                 else:
@@ -146,5 +159,5 @@ class CrestronLight(LightEntity):
             current_brightness = self._hub.get_analog(self._join)
             for i in range(transition_time * 20):
                 current_brightness = current_brightness + incr_per_step
-                self._hub.set_analog(self._join, int(current_brightness))
+                self._hub.set_analog(self._join, int(current_brightness), PRIORITY_BULK)
                 await asyncio.sleep(0.05)
@@ -22,9 +22,9 @@ from .const import (
     CONF_VOLUME_DOWN_JOIN,
     CONF_VOLUME_JOIN,
     CONF_VOLUME_UP_JOIN,
-    DOMAIN,
-    HUB,
+    CONF_HUB,
 )
+from . import get_hub, unique_id_prefix
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -37,6 +37,7 @@ SOURCES_SCHEMA = vol.Schema(
 PLATFORM_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_NAME): cv.string,
+        vol.Optional(CONF_HUB): cv.slug,
         vol.Required(CONF_MUTE_JOIN): cv.positive_int,
         vol.Required(CONF_SOURCE_NUM_JOIN): cv.positive_int,
         vol.Required(CONF_VOLUME_UP_JOIN): cv.positive_int,
@@ -51,7 +52,9 @@ PLATFORM_SCHEMA = vol.Schema(
 
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
-    hub = hass.data[DOMAIN][HUB]
+    hub = get_hub(hass, config)
+    if hub is None:
+        return
     entity = [CrestronRoom(hub, config)]
     async_add_entities(entity)
 
@@ -59,6 +62,7 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
 class CrestronRoom(MediaPlayerEntity):
     def __init__(self, hub, config):
         self._hub = hub
+        self._unique_id_prefix = unique_id_prefix(config)
         self._name = config.get(CONF_NAME)
         self._device_class = "speaker"
         self._supported_features = (
@@ -80,9 +84,11 @@ class CrestronRoom(MediaPlayerEntity):
 
     async def async_added_to_hass(self):
         self._hub.register_callback(self.process_callback)
+        self._hub.register_availability_callback(self.async_write_ha_state)
 
     async def async_will_remove_from_hass(self):
         self._hub.remove_callback(self.process_callback)
+        self._hub.remove_availability_callback(self.async_write_ha_state)
 
     async def process_callback(self, cbtype, value):
         self.async_write_ha_state()
@@ -97,7 +103,7 @@ class CrestronRoom(MediaPlayerEntity):
 
     @property
     def unique_id(self):
-        return "media-player-" + str(self._source_number_join)
+        return self._unique_id_prefix + "media-player-" + str(self._source_number_join)
 
     @property
     def should_poll(self):
@@ -157,7 +163,8 @@ class CrestronRoom(MediaPlayerEntity):
         return self._hub.set_analog(self._volume_level_join, math.ceil(volume * 65535))
 
     async def async_turn_on(self):
-        self._hub.set_digital(self._on_join, 1)
+        # Only ever sent high, so it must not be suppressed as a duplicate
+        self._hub.set_digital(self._on_join, 1, force=True)
 
     async def async_turn_off(self):
         self._hub.set_digital(self._off_join, 1)
@@ -0,0 +1,125 @@
+"""On-demand profiling of the Crestron XSIG hot path"""
+
+import asyncio
+import cProfile
+import logging
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+_LOGGER = logging.getLogger(__name__)
+
+MODE_CPROFILE = "cprofile"
+MODE_SAMPLE = "sample"
+
+COMPONENT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class CrestronProfiler:
+    """Runs one profiling session at a time.  Nothing is hooked while idle."""
+
+    def __init__(self, hass):
+        self.hass = hass
+        self._running = False
+
+    async def profile(self, mode, duration, interval):
+        """Profile the event loop for duration seconds and write the result to the config dir"""
+        if self._running:
+            _LOGGER.warning("Profiling already in progress")
+            return None
+        self._running = True
+        try:
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            if mode == MODE_SAMPLE:
+                path = self.hass.config.path(f"crestron_profile_{stamp}.collapsed")
+                await self._sample(path, duration, interval)
+            else:
+                path = self.hass.config.path(f"crestron_profile_{stamp}.prof")
+                await self._cprofile(path, duration)
+        finally:
+            self._running = False
+        _LOGGER.info(f"Profile written to {path}")
+        return path
+
+    async def _cprofile(self, path, duration):
+        """Deterministic profile of this component on the event loop thread (pstats format)"""
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            profiler.disable()
+        profiler.create_stats()
+        stats = _component_stats(profiler.stats)
+        await self.hass.async_add_executor_job(_write_stats, path, stats)
+
+    async def _sample(self, path, duration, interval):
+        """Sample event loop thread stacks that pass through this component (collapsed-stack format)"""
+        sampler = _StackSampler(threading.get_ident(), interval)
+        sampler.start()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            sampler.stop()
+        await self.hass.async_add_executor_job(sampler.join)
+        await self.hass.async_add_executor_job(sampler.write, path)
+
+
+def _component_stats(stats):
+    """Keep this component's functions and the functions they call directly
+
+    cProfile sees the whole event loop thread; like sample mode, the result is limited to
+    this component's code paths.  Caller entries are trimmed to the functions kept.
+    """
+    ours = {func for func in stats if func[0].startswith(COMPONENT_DIR)}
+    keep = set(ours)
+    for func, (_, _, _, _, callers) in stats.items():
+        if not ours.isdisjoint(callers):
+            keep.add(func)
+    trimmed = {}
+    for func in keep:
+        cc, nc, tt, ct, callers = stats[func]
+        callers = {caller: timing for caller, timing in callers.items() if caller in keep}
+        trimmed[func] = (cc, nc, tt, ct, callers)
+    return trimmed
+
+
+def _write_stats(path, stats):
+    """Write stats in the file format of cProfile.Profile.dump_stats"""
+    with open(path, "wb") as f:
+        marshal.dump(stats, f)
+
+
+class _StackSampler(threading.Thread):
+    def __init__(self, thread_id, interval):
+        super().__init__(name="crestron-profiler", daemon=True)
+        self._thread_id = thread_id
+        self._interval = interval
+        self._stopped = threading.Event()
+        self.samples = Counter()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            ours = False
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename.startswith(COMPONENT_DIR):
+                    ours = True
+                module = os.path.splitext(os.path.basename(code.co_filename))[0]
+                stack.append(f"{module}:{code.co_name}")
+                frame = frame.f_back
+            if ours:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
@@ -1,56 +1,118 @@
 """Platform for Crestron Sensor integration."""
 
+from datetime import timedelta
 import voluptuous as vol
 import logging
 
+from homeassistant.components.sensor import SensorEntity, SensorStateClass
 from homeassistant.helpers.entity import Entity
-from homeassistant.const import CONF_NAME, CONF_DEVICE_CLASS, CONF_UNIT_OF_MEASUREMENT
+from homeassistant.const import (
+    CONF_NAME,
+    CONF_DEVICE_CLASS,
+    CONF_UNIT_OF_MEASUREMENT,
+    EntityCategory,
+)
 import homeassistant.helpers.config_validation as cv
 
-from .const import HUB, DOMAIN, CONF_VALUE_JOIN, CONF_DIVISOR
+from .const import CONF_HUB, CONF_VALUE_JOIN, CONF_DIVISOR, CONF_SCALE
+from . import get_hub, unique_id_prefix
+from .transform import TRANSFORM_SCHEMA, compile_transform_config
 
 _LOGGER = logging.getLogger(__name__)
 
-PLATFORM_SCHEMA = vol.Schema(
-    {
-        vol.Required(CONF_NAME): cv.string,
-        vol.Required(CONF_VALUE_JOIN): cv.positive_int,
-        vol.Required(CONF_DEVICE_CLASS): cv.string,
-        vol.Required(CONF_UNIT_OF_MEASUREMENT): cv.string,
-        vol.Optional(CONF_DIVISOR, default=1): int,
-    },
-    extra=vol.ALLOW_EXTRA,
+PLATFORM_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Required(CONF_NAME): cv.string,
+            vol.Optional(CONF_HUB): cv.slug,
+            vol.Required(CONF_VALUE_JOIN): cv.positive_int,
+            vol.Required(CONF_DEVICE_CLASS): cv.string,
+            vol.Required(CONF_UNIT_OF_MEASUREMENT): cv.string,
+            vol.Optional(CONF_DIVISOR): vol.All(int, vol.NotIn([0], msg="divisor cannot be 0")),
+            **TRANSFORM_SCHEMA,
+        },
+        extra=vol.ALLOW_EXTRA,
+    ),
+    # divisor and scale both rescale the value, so only one of them may be given
+    cv.has_at_most_one_key(CONF_DIVISOR, CONF_SCALE),
 )
 
+# Diagnostic hub sensors are polled so counters never update per frame
+SCAN_INTERVAL = timedelta(seconds=30)
+
+# (stats key, friendly name, unit, state class)
+HUB_STATS = [
+    ("frames_in_digital", "Digital Frames In", None, SensorStateClass.TOTAL_INCREASING),
+    ("frames_in_analog", "Analog Frames In", None, SensorStateClass.TOTAL_INCREASING),
+    ("frames_in_serial", "Serial Frames In", None, SensorStateClass.TOTAL_INCREASING),
+    ("frames_out_digital", "Digital Frames Out", None, SensorStateClass.TOTAL_INCREASING),
+    ("frames_out_analog", "Analog Frames Out", None, SensorStateClass.TOTAL_INCREASING),
+    ("frames_out_serial", "Serial Frames Out", None, SensorStateClass.TOTAL_INCREASING),
+    ("bytes_in", "Bytes In", "B", SensorStateClass.TOTAL_INCREASING),
+    ("bytes_out", "Bytes Out", "B", SensorStateClass.TOTAL_INCREASING),
+    ("unknown_packets", "Unknown Packets", None, SensorStateClass.TOTAL_INCREASING),
+    ("resync_requests", "Resync Requests", None, SensorStateClass.TOTAL_INCREASING),
+    ("resyncs_merged", "Merged Resync Requests", None, SensorStateClass.TOTAL_INCREASING),
+    ("idle_timeouts", "Idle Timeouts", None, SensorStateClass.TOTAL_INCREASING),
+    ("failovers", "Failovers", None, SensorStateClass.TOTAL_INCREASING),
+    ("dispatch_time_avg", "Callback Dispatch Time (avg)", "ms", SensorStateClass.MEASUREMENT),
+    ("dispatch_time_max", "Callback Dispatch Time (max)", "ms", SensorStateClass.MEASUREMENT),
+    ("read_block_max", "Read Loop Block Time (max)", "ms", SensorStateClass.MEASUREMENT),
+    ("read_yields", "Read Loop Yields", None, SensorStateClass.TOTAL_INCREASING),
+    ("inbound_conflated", "Conflated Inbound Values", None, SensorStateClass.TOTAL_INCREASING),
+    ("inbound_pending", "Pending Inbound Updates", None, SensorStateClass.MEASUREMENT),
+    ("outbound_buffer", "Outbound Buffer", "B", SensorStateClass.MEASUREMENT),
+    ("outbound_queued", "Outbound Queued Frames", None, SensorStateClass.MEASUREMENT),
+    ("throttle_waits", "Throttle Waits", None, SensorStateClass.TOTAL_INCREASING),
+    ("throttle_time", "Throttle Time", "s", SensorStateClass.TOTAL_INCREASING),
+    ("outbound_suppressed", "Suppressed Duplicates", None, SensorStateClass.TOTAL_INCREASING),
+    ("serial_errors", "Skipped Serial Frames", None, SensorStateClass.TOTAL_INCREASING),
+    ("uptime", "Connection Uptime", "s", SensorStateClass.MEASUREMENT),
+    ("connections", "Connections", None, SensorStateClass.MEASUREMENT),
+]
+
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
-    hub = hass.data[DOMAIN][HUB]
-    entity = [CrestronSensor(hub, config)]
+    if discovery_info is not None:
+        hub = get_hub(hass, discovery_info)
+        entity = [
+            CrestronHubSensor(hub, discovery_info.get(CONF_HUB), *stat)
+            for stat in HUB_STATS
+        ]
+    else:
+        hub = get_hub(hass, config)
+        if hub is None:
+            return
+        entity = [CrestronSensor(hub, config)]
     async_add_entities(entity)
 
 
 class CrestronSensor(Entity):
     def __init__(self, hub, config):
         self._hub = hub
+        self._unique_id_prefix = unique_id_prefix(config)
         self._name = config.get(CONF_NAME)
         self._join = config.get(CONF_VALUE_JOIN)
         self._device_class = config.get(CONF_DEVICE_CLASS)
         self._unit_of_measurement = config.get(CONF_UNIT_OF_MEASUREMENT)
-        self._divisor = config.get(CONF_DIVISOR)
+        self._divisor = config.get(CONF_DIVISOR, 1)
         _LOGGER.debug(f"Divisor is {self._divisor}.")
+        self._transform = compile_transform_config(config, divisor=self._divisor)
 
     async def async_added_to_hass(self):
         self._hub.register_callback(self.process_callback)
+        self._hub.register_availability_callback(self.async_write_ha_state)
 
     async def async_will_remove_from_hass(self):
         self._hub.remove_callback(self.process_callback)
+        self._hub.remove_availability_callback(self.async_write_ha_state)
 
     async def process_callback(self, cbtype, value):
         self.async_write_ha_state()
 
     @property
     def unique_id(self):
-        return "sensor-" + str(self._join) + str(self._device_class)
+        return self._unique_id_prefix + "sensor-" + str(self._join) + str(self._device_class)
 
     @property
     def available(self):
@@ -66,7 +128,7 @@ class CrestronSensor(Entity):
 
     @property
     def state(self):
-        return self._hub.get_analog(self._join) / self._divisor
+        return self._transform(self._hub.get_analog(self._join))
 
     @property
     def device_class(self):
@@ -75,3 +137,60 @@ class CrestronSensor(Entity):
     @property
     def unit_of_measurement(self):
         return self._unit_of_measurement
+
+
+class CrestronHubSensor(SensorEntity):
+    def __init__(self, hub, hub_name, key, name, unit, state_class):
+        self._hub = hub
+        self._unique_id_prefix = unique_id_prefix({CONF_HUB: hub_name})
+        self._key = key
+        if hub_name is None:
+            self._name = "Crestron " + name
+        else:
+            self._name = f"Crestron {hub_name} {name}"
+        self._unit_of_measurement = unit
+        self._state_class = state_class
+
+    @property
+    def unique_id(self):
+        return self._unique_id_prefix + "crestron-hub-" + self._key
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def should_poll(self):
+        return True
+
+    @property
+    def entity_category(self):
+        return EntityCategory.DIAGNOSTIC
+
+    @property
+    def state_class(self):
+        return self._state_class
+
+    @property
+    def native_value(self):
+        return self._hub.get_stats()[self._key]
+
+    @property
+    def extra_state_attributes(self):
+        if self._key != "connections":
+            return None
+        # One entry per connected control system, oldest first
+        return {
+            "clients": [
+                {
+                    "peer": peer if peer is None else f"{peer[0]}:{peer[1]}",
+                    "connected": int(seconds),
+                    "standby": standby,
+                }
+                for peer, seconds, standby in self._hub.get_connections()
+            ]
+        }
+
+    @property
+    def native_unit_of_measurement(self):
+        return self._unit_of_measurement
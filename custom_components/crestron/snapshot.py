@@ -0,0 +1,78 @@
+"""Save (and load) the join store to compact binary snapshot files"""
+
+import mmap
+import os
+import struct
+
+from .codec import truncate_utf8
+
+MAGIC = b"XSIGSNP1"
+
+# Snapshot file = MAGIC + counts, then the digital, analog and serial joins:
+#   digital: join (2 bytes), value (1 byte)
+#   analog:  join (2 bytes), value (2 bytes)
+#   serial:  join (2 bytes), length (2 bytes), utf-8 bytes
+_COUNTS = struct.Struct("<HHH")
+_DIGITAL = struct.Struct("<HB")
+_ANALOG = struct.Struct("<HH")
+_SERIAL = struct.Struct("<HH")
+# Longest serial value a snapshot keeps (bytes); longer values are cut on a character boundary
+MAX_SNAPSHOT_SERIAL = 0xFFFF
+
+
+def dump_snapshot(digital, analog, serial):
+    """Return the snapshot bytes for the digital/analog/serial join dicts"""
+    data = bytearray(MAGIC + _COUNTS.pack(len(digital), len(analog), len(serial)))
+    for join, value in digital.items():
+        data += _DIGITAL.pack(join, bool(value))
+    for join, value in analog.items():
+        data += _ANALOG.pack(join, value)
+    for join, string in serial.items():
+        encoded = truncate_utf8(string.encode(errors="replace"), MAX_SNAPSHOT_SERIAL)
+        data += _SERIAL.pack(join, len(encoded))
+        data += encoded
+    return bytes(data)
+
+
+def load_snapshot(data):
+    """Return (digital, analog, serial) join dicts from snapshot bytes (or an mmap)"""
+    if data[: len(MAGIC)] != MAGIC:
+        raise ValueError("not an XSIG join snapshot")
+    offset = len(MAGIC)
+    digitals, analogs, serials = _COUNTS.unpack_from(data, offset)
+    offset += _COUNTS.size
+    digital = {}
+    for join, value in _DIGITAL.iter_unpack(data[offset : offset + digitals * _DIGITAL.size]):
+        digital[join] = bool(value)
+    offset += digitals * _DIGITAL.size
+    analog = dict(_ANALOG.iter_unpack(data[offset : offset + analogs * _ANALOG.size]))
+    offset += analogs * _ANALOG.size
+    serial = {}
+    for _ in range(serials):
+        join, length = _SERIAL.unpack_from(data, offset)
+        offset += _SERIAL.size
+        serial[join] = bytes(data[offset : offset + length]).decode(errors="replace")
+        offset += length
+    return digital, analog, serial
+
+
+def write_snapshot(path, data):
+    """Atomically replace the snapshot file with data (blocking)"""
+    temp = path + ".tmp"
+    with open(temp, "wb") as f:
+        f.write(data)
+    os.replace(temp, path)
+
+
+def read_snapshot(path, use_mmap=False):
+    """Return (digital, analog, serial) from a snapshot file, or None if there is none (blocking)"""
+    try:
+        with open(path, "rb") as f:
+            if not use_mmap:
+                return load_snapshot(f.read())
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return load_snapshot(mapped)
+    except FileNotFoundError:
+        return None
+    except struct.error as err:
+        raise ValueError(f"truncated XSIG join snapshot: {err}") from err
@@ -7,13 +7,16 @@ import asyncio
 import homeassistant.helpers.config_validation as cv
 from homeassistant.components.switch import SwitchEntity
 from homeassistant.const import STATE_ON, STATE_OFF, CONF_NAME, CONF_DEVICE_CLASS
-from .const import HUB, DOMAIN, CONF_SWITCH_JOIN, CONF_PULSED
+from .const import CONF_HUB, CONF_SWITCH_JOIN, CONF_PULSED
+from . import get_hub, unique_id_prefix
+from .crestron import PRIORITY_HIGH
 
 _LOGGER = logging.getLogger(__name__)
 
 PLATFORM_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_NAME): cv.string,
+        vol.Optional(CONF_HUB): cv.slug,
         vol.Required(CONF_PULSED): cv.boolean,
         vol.Optional(CONF_DEVICE_CLASS): cv.string,
         vol.Required(CONF_SWITCH_JOIN): cv.positive_int,           
@@ -22,7 +25,9 @@ PLATFORM_SCHEMA = vol.Schema(
 )
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
-    hub = hass.data[DOMAIN][HUB]
+    hub = get_hub(hass, config)
+    if hub is None:
+        return
     entity = [CrestronSwitch(hub, config)]
     async_add_entities(entity)
 
@@ -30,6 +35,7 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
 class CrestronSwitch(SwitchEntity):
     def __init__(self, hub, config):
         self._hub = hub
+        self._unique_id_prefix = unique_id_prefix(config)
         self._name = config.get(CONF_NAME)
         self._switch_join = config.get(CONF_SWITCH_JOIN)
         self._device_class = config.get(CONF_DEVICE_CLASS, "switch")
@@ -37,9 +43,11 @@ class CrestronSwitch(SwitchEntity):
 
     async def async_added_to_hass(self):
         self._hub.register_callback(self.process_callback)
+        self._hub.register_availability_callback(self.async_write_ha_state)
 
     async def async_will_remove_from_hass(self):
         self._hub.remove_callback(self.process_callback)
+        self._hub.remove_availability_callback(self.async_write_ha_state)
 
     async def process_callback(self, cbtype, value):
         self.async_write_ha_state()
@@ -54,7 +62,7 @@ class CrestronSwitch(SwitchEntity):
 
     @property
     def unique_id(self):
-        return 'switch-' + str(self._switch_join)
+        return self._unique_id_prefix + 'switch-' + str(self._switch_join)
 
     @property
     def should_poll(self):
@@ -80,19 +88,19 @@ class CrestronSwitch(SwitchEntity):
             # Pulsed switches can only be switched by signal pulses
             # Therefore, must check if switch is not already on
             if not self.is_on:
-                self._hub.set_digital(self._switch_join, True)
+                self._hub.set_digital(self._switch_join, True, PRIORITY_HIGH)
                 await asyncio.sleep(0.05)
-                self._hub.set_digital(self._switch_join, False)
+                self._hub.set_digital(self._switch_join, False, PRIORITY_HIGH)
         else:
-            self._hub.set_digital(self._switch_join, True)
+            self._hub.set_digital(self._switch_join, True, PRIORITY_HIGH)
 
     async def async_turn_off(self, **kwargs):
         if self._pulsed:
             # Pulsed switches can only be switched by signal pulses
             # Therefore, must check if switch is not already off
             if self.is_on:
-                self._hub.set_digital(self._switch_join, True)
+                self._hub.set_digital(self._switch_join, True, PRIORITY_HIGH)
                 await asyncio.sleep(0.05)
-                self._hub.set_digital(self._switch_join, False)
+                self._hub.set_digital(self._switch_join, False, PRIORITY_HIGH)
         else:
-            self._hub.set_digital(self._switch_join, False)
+            self._hub.set_digital(self._switch_join, False, PRIORITY_HIGH)
@@ -0,0 +1,91 @@
+"""Declarative value transforms (map/scale/offset/clamp) compiled to plain callables"""
+
+import voluptuous as vol
+
+import homeassistant.helpers.config_validation as cv
+
+from .const import CONF_SCALE, CONF_OFFSET, CONF_CLAMP, CONF_MAP
+
+# compile_inverse divides by scale
+SCALE_SCHEMA = vol.All(vol.Coerce(float), vol.NotIn([0.0], msg="scale cannot be 0"))
+
+TRANSFORM_SCHEMA = {
+    vol.Optional(CONF_SCALE): SCALE_SCHEMA,
+    vol.Optional(CONF_OFFSET): vol.Coerce(float),
+    vol.Optional(CONF_CLAMP): vol.ExactSequence(
+        [vol.Coerce(float), vol.Coerce(float)]
+    ),
+    vol.Optional(CONF_MAP): vol.Schema({cv.string: vol.Any(bool, int, float, str)}),
+}
+
+_MISSING = object()
+
+
+def compile_transform(
+    scale=None, offset=None, clamp=None, value_map=None, as_int=False, divisor=None
+):
+    """Return a callable for value -> map -> divisor -> scale -> offset -> clamp (-> int)
+
+    divisor is a true division (217 / 10 is 21.7, where 217 * 0.1 is 21.700000000000003).
+
+    Values found in value_map are returned as mapped.  Anything else goes through the
+    numeric steps; values that are not numbers (e.g. "unavailable") become None.
+    Returns None if no step is configured, so callers can skip the call entirely.
+    """
+    numeric = (
+        scale is not None
+        or offset is not None
+        or clamp is not None
+        or divisor is not None
+        or as_int
+    )
+    if value_map is None and not numeric:
+        return None
+    scale = 1.0 if scale is None else scale
+    divisor = 1 if divisor is None else divisor
+    offset = 0.0 if offset is None else offset
+    low, high = clamp if clamp is not None else (None, None)
+
+    def to_number(value):
+        try:
+            value = float(value) / divisor * scale + offset
+        except (TypeError, ValueError):
+            return None
+        if low is not None:
+            if value < low:
+                value = low
+            elif value > high:
+                value = high
+        return int(value) if as_int else value
+
+    if value_map is None:
+        return to_number
+
+    value_map = {str(key): mapped for key, mapped in value_map.items()}
+
+    def transform(value):
+        mapped = value_map.get(str(value), _MISSING)
+        if mapped is not _MISSING:
+            return mapped
+        if numeric:
+            return to_number(value)
+        return value
+
+    return transform
+
+
+def compile_transform_config(config, as_int=False, **defaults):
+    """compile_transform from a config dict validated with TRANSFORM_SCHEMA"""
+    return compile_transform(
+        config.get(CONF_SCALE, defaults.get("scale")),
+        config.get(CONF_OFFSET, defaults.get("offset")),
+        config.get(CONF_CLAMP, defaults.get("clamp")),
+        config.get(CONF_MAP, defaults.get("value_map")),
+        as_int,
+        defaults.get("divisor"),
+    )
+
+
+def compile_inverse(scale, offset=0.0, clamp=None, as_int=True):
+    """Inverse of a scale/offset transform (HA value back to join value)"""
+    return compile_transform(1 / scale, -offset / scale, clamp, None, as_int)
@@ -0,0 +1,37 @@
+"""Tests for the XSIG capture file format"""
+
+from tools._component import load
+
+capture = load("capture")
+
+
+def _capture(path, records):
+    writer = capture.CaptureWriter(str(path))
+    for direction, data in records:
+        writer.record(direction, data)
+        writer.write(writer.take())
+    return writer
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "crestron_capture.xcap"
+    records = [(capture.DIRECTION_IN, b"\x80\x00"), (capture.DIRECTION_OUT, b"\xfd")]
+    _capture(path, records)
+    assert [(d, data) for _, d, data in capture.read_capture(str(path))] == records
+
+
+def test_large_payload_is_split(tmp_path):
+    path = tmp_path / "crestron_capture.xcap"
+    data = bytes(range(256)) * 300
+    _capture(path, [(capture.DIRECTION_IN, data)])
+    payloads = [payload for _, _, payload in capture.read_capture(str(path))]
+    assert len(payloads) == 2
+    assert b"".join(payloads) == data
+
+
+def test_second_capture_replaces_the_file(tmp_path):
+    path = tmp_path / "crestron_capture.xcap"
+    _capture(path, [(capture.DIRECTION_IN, b"\x80\x00" * 10)])
+    second = [(capture.DIRECTION_IN, b"\xc0\x00\x00\x01"), (capture.DIRECTION_OUT, b"\xfd")]
+    _capture(path, second)
+    assert [(d, data) for _, d, data in capture.read_capture(str(path))] == second
@@ -0,0 +1,208 @@
+"""Round-trip and property tests for the XSIG codec"""
+
+import random
+
+import pytest
+
+from tools._component import load
+
+codec = load("codec")
+
+SERIAL_SAMPLES = [
+    "",
+    "a",
+    "Now playing: Ünïcødé ♫",
+    "日本語テキスト",
+    "emoji 🎵🎶",
+    "x" * codec.MAX_SERIAL_LENGTH,
+]
+
+
+def _decode_stream(data, **options):
+    """Decode a whole stream, returning (kind, join, value) for every frame"""
+    frames = []
+    offset = 0
+    while True:
+        frame = codec.decode_frame(data, offset, **options)
+        if frame is None:
+            return frames, offset
+        kind, join, value, next_offset = frame
+        assert next_offset > offset
+        frames.append((kind, join, value))
+        offset = next_offset
+
+
+@pytest.mark.parametrize("value", [True, False])
+def test_digital_round_trip(value):
+    for join in range(1, codec.MAX_DIGITAL_JOIN + 1):
+        data = codec.encode_digital(join, value)
+        assert codec.decode_frame(data) == (codec.DIGITAL, join, value, 2)
+
+
+@pytest.mark.parametrize("join", [1, 2, 127, 128, 129, 512, 1023, codec.MAX_ANALOG_JOIN])
+def test_analog_round_trip(join):
+    for value in range(codec.MAX_ANALOG_VALUE + 1):
+        data = codec.encode_analog(join, value)
+        assert codec.decode_frame(data) == (codec.ANALOG, join, value, 4)
+
+
+@pytest.mark.parametrize(
+    "value, first_bits",
+    [(0x0000, 0b00), (0x3FFF, 0b00), (0x4000, 0b01), (0x8000, 0b10), (0xC000, 0b11), (0xFFFF, 0b11)],
+)
+def test_analog_high_bits_packed_in_header(value, first_bits):
+    data = codec.encode_analog(1, value)
+    # Value bits 15-14 go in header bits 5-4, every other byte keeps its high bit clear
+    assert data[0] >> 4 & 0b11 == first_bits
+    assert data[0] & 0b11000000 == 0b11000000
+    assert all(not byte & 0b10000000 for byte in data[1:])
+    assert codec.decode_frame(data)[2] == value
+
+
+@pytest.mark.parametrize("string", SERIAL_SAMPLES)
+def test_serial_round_trip(string):
+    for join in (1, 128, 777, codec.MAX_SERIAL_JOIN):
+        data = codec.encode_serial(join, string.encode())
+        assert codec.decode_frame(data) == (codec.SERIAL, join, string, len(data))
+
+
+def test_sync_all():
+    assert codec.decode_frame(b"\xfb") == (codec.SYNC_ALL, None, None, 1)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        codec.encode_digital(4096, True),
+        codec.encode_analog(1024, 0xC001),
+        codec.encode_serial(77, "héllo".encode()),
+    ],
+)
+def test_truncated_frames_wait_for_more(data):
+    for end in range(len(data)):
+        assert codec.decode_frame(data[:end]) is None
+
+
+def test_random_streams_round_trip():
+    rng = random.Random(0)
+    for _ in range(2000):
+        expected = []
+        for _ in range(rng.randint(1, 20)):
+            kind = rng.choice((codec.DIGITAL, codec.ANALOG, codec.SERIAL))
+            if kind == codec.DIGITAL:
+                expected.append((kind, rng.randint(1, 4096), rng.random() < 0.5))
+            elif kind == codec.ANALOG:
+                expected.append((kind, rng.randint(1, 1024), rng.randint(0, 0xFFFF)))
+            else:
+                expected.append((kind, rng.randint(1, 1024), rng.choice(SERIAL_SAMPLES)))
+        data = b"".join(
+            codec.encode_digital(join, value)
+            if kind == codec.DIGITAL
+            else codec.encode_analog(join, value)
+            if kind == codec.ANALOG
+            else codec.encode_serial(join, value.encode())
+            for kind, join, value in expected
+        )
+        assert _decode_stream(data) == (expected, len(data))
+
+
+def test_random_bytes_never_stall():
+    rng = random.Random(1)
+    for _ in range(2000):
+        data = bytes(rng.randrange(256) for _ in range(rng.randint(1, 64)))
+        # Asserts progress on every frame; errors="replace" so no payload is rejected
+        _decode_stream(data, max_serial=32, errors="replace")
+
+
+def test_invalid_serial_payload_is_skipped():
+    after = codec.encode_digital(9, True)
+    frames, _ = _decode_stream(b"\xc8\x00\xc3\x28\xff" + after)
+    assert frames == [(codec.SERIAL_INVALID, 1, None), (codec.DIGITAL, 9, True)]
+
+
+def test_invalid_serial_payload_replaced():
+    frames, _ = _decode_stream(b"\xc8\x00\xc3\x28\xff", errors="replace")
+    assert frames == [(codec.SERIAL, 1, "�(")]
+
+
+def test_latin1_serial():
+    frames, _ = _decode_stream(b"\xc8\x00\xe9\xff", encoding="latin-1")
+    assert frames == [(codec.SERIAL, 1, "é")]
+
+
+def _decode_chunks(data, size, **options):
+    """Decode data fed size bytes at a time, skipping oversized serials like the hub does"""
+    frames = []
+    buffer = bytearray()
+    skipping = False
+    for position in range(0, len(data), size):
+        buffer += data[position : position + size]
+        offset = 0
+        while True:
+            if skipping:
+                next_offset = codec.skip_serial(buffer, offset)
+                if next_offset is None:
+                    offset = len(buffer)
+                    break
+                offset, skipping = next_offset, False
+            frame = codec.decode_frame(buffer, offset, **options)
+            if frame is None:
+                break
+            kind, join, value, offset = frame
+            frames.append((kind, join, value))
+            skipping = kind == codec.SERIAL_OVERSIZED and value is True
+        del buffer[:offset]
+        assert len(buffer) <= options["max_serial"] + 2
+    return frames
+
+
+@pytest.mark.parametrize("max_serial", [4, 16, 252])
+def test_oversized_serial_resyncs(max_serial):
+    after = codec.encode_digital(9, True)
+    data = b"\xc8\x00" + b"x" * (max_serial + 1) + b"\xff" + after
+    frames, _ = _decode_stream(data, max_serial=max_serial)
+    assert frames == [(codec.SERIAL_OVERSIZED, 1, False), (codec.DIGITAL, 9, True)]
+
+
+@pytest.mark.parametrize("size", [1, 5, 64, 4096])
+@pytest.mark.parametrize(
+    "text, encoding",
+    [("Café au lait, très bon ", "utf-8"), ("À la carte ±5 ", "latin-1"), ("Ça coûte 5€ ", "cp1252")],
+)
+def test_oversized_payload_never_decodes_as_frames(text, encoding, size):
+    after = codec.encode_digital(9, True)
+    data = b"\xc8\x00" + text.encode(encoding) * 30 + b"\xff" + after
+    frames = _decode_chunks(data, size, max_serial=252, encoding=encoding)
+    # value is True when the terminator arrived in a later chunk
+    assert [frame[:2] for frame in frames] == [(codec.SERIAL_OVERSIZED, 1), (codec.DIGITAL, 9)]
+    assert frames[1] == (codec.DIGITAL, 9, True)
+
+
+def test_oversized_serial_without_terminator_is_dropped():
+    # The terminator was lost: nothing up to the next terminator is trusted
+    data = b"\xc8\x00" + "Café au lait, très bon ".encode() * 20 + codec.encode_digital(9, True)
+    assert _decode_chunks(data, 16, max_serial=252) == [(codec.SERIAL_OVERSIZED, 1, True)]
+
+
+@pytest.mark.parametrize("max_serial", [4, 16, 252])
+def test_serial_at_max_length_is_accepted(max_serial):
+    string = "y" * max_serial
+    data = codec.encode_serial(3, string.encode())
+    assert codec.decode_frame(data, max_serial=max_serial) == (codec.SERIAL, 3, string, len(data))
+
+
+def test_pending_serial_below_max_waits():
+    assert codec.decode_frame(b"\xc8\x00" + b"x" * 16, max_serial=16) is None
+
+
+@pytest.mark.parametrize("string", SERIAL_SAMPLES + ["é" * 200, "日本" * 100, "🎵" * 80, "a" + "é" * 200])
+def test_truncate_utf8_keeps_whole_characters(string):
+    data = string.encode()
+    for limit in range(codec.MAX_SERIAL_LENGTH + 1):
+        cut = codec.truncate_utf8(data, limit)
+        assert len(cut) <= limit
+        decoded = cut.decode("utf-8")
+        assert string.startswith(decoded)
+        if len(decoded) < len(string):
+            # The next character would not have fit
+            assert len(cut) + len(string[len(decoded)].encode()) > limit
@@ -0,0 +1,530 @@
+"""End-to-end tests of the XSIG server against the control system simulator"""
+
+import asyncio
+import socket
+import time
+from contextlib import asynccontextmanager
+
+from tools._component import load
+from tools.xsig_simulator import ControlSystemSimulator
+
+codec = load("codec")
+crestron = load("crestron")
+snapshot = load("snapshot")
+
+
+@asynccontextmanager
+async def connected(recv_buffer=None, digital=None, analog=None, serial=None, **kwargs):
+    """Yield (hub, sim) once the simulator has connected and seen the update request"""
+    hub = crestron.CrestronXsig(**kwargs)
+    await hub.listen(0)
+    port = hub._server.sockets[0].getsockname()[1]
+    sim = ControlSystemSimulator(
+        "127.0.0.1", port, digital, analog, serial, recv_buffer=recv_buffer
+    )
+    await sim.connect()
+    try:
+        await sim.wait_update_requests()
+        yield hub, sim
+    finally:
+        await sim.close()
+        await hub.stop()
+
+
+async def connect_sim(hub, **joins):
+    """Connect another simulator to a listening hub and wait for its update request"""
+    port = hub._server.sockets[0].getsockname()[1]
+    sim = ControlSystemSimulator("127.0.0.1", port, **joins)
+    await sim.connect()
+    await sim.wait_update_requests()
+    return sim
+
+
+def availability_recorder(hub):
+    """Record is_available() every time the hub announces an availability change"""
+    seen = []
+    hub.register_availability_callback(lambda: seen.append(hub.is_available()))
+    return seen
+
+
+def shrink_send_buffers(hub):
+    """Keep the kernel from absorbing megabytes, so a paused simulator backs up the hub"""
+    for writer in hub._connections:
+        writer.get_extra_info("socket").setsockopt(
+            socket.SOL_SOCKET, socket.SO_SNDBUF, 4096
+        )
+
+
+async def wait_for(predicate, timeout=5):
+    async with asyncio.timeout(timeout):
+        while not predicate():
+            await asyncio.sleep(0.001)
+
+
+async def wait_bytes_in(hub, *sims):
+    """Wait until the hub has read everything the simulators sent (bytes_in counts them all)"""
+    for sim in sims:
+        await sim.drain()
+    await wait_for(
+        lambda: hub.get_stats()["bytes_in"] >= sum(sim.bytes_sent for sim in sims)
+    )
+
+
+def recorder(dispatched, delay=0):
+    async def process_callback(cbtype, value):
+        dispatched.append((cbtype, value))
+        if delay:
+            await asyncio.sleep(delay)
+
+    return process_callback
+
+
+def test_join_dump_and_outbound_joins():
+    async def run():
+        async with connected(
+            digital={1: True}, analog={2: 1234}, serial={3: "Ünïcødé"}
+        ) as (hub, sim):
+            await wait_bytes_in(hub, sim)
+            assert hub.get_digital(1) is True
+            assert hub.get_analog(2) == 1234
+            assert hub.get_serial(3) == "Ünïcødé"
+            hub.set_digital(4, True)
+            hub.set_analog(5, 65535)
+            hub.set_serial(6, "hello")
+            await sim.wait_received(3)
+            assert sim.received == [
+                (codec.DIGITAL, 4, True),
+                (codec.ANALOG, 5, 65535),
+                (codec.SERIAL, 6, "hello"),
+            ]
+
+    asyncio.run(run())
+
+
+def test_high_priority_overtakes_queued_bulk():
+    async def run():
+        async with connected(recv_buffer=4096, dedup=False) as (hub, sim):
+            shrink_send_buffers(hub)
+            sim.pause_reading()
+            sent = 0
+            while hub.get_stats()["outbound_queued"] < 1000:
+                hub.set_analog(1, sent & 0xFFFF, crestron.PRIORITY_BULK)
+                sent += 1
+            queued = hub.get_stats()["outbound_queued"]
+            hub.set_digital(5, True, crestron.PRIORITY_HIGH)
+            sim.resume_reading()
+            await sim.wait_received(sent + 1)
+            position = sim.received.index((codec.DIGITAL, 5, True))
+            assert len(sim.received) - 1 - position >= queued
+
+    asyncio.run(run())
+
+
+def test_resync_does_not_hold_back_high_priority():
+    async def run():
+        async with connected(recv_buffer=4096) as (hub, sim):
+
+            async def sync_joins_to_hub():
+                for join in range(1, 1001):
+                    hub.set_serial(join, f"{join:050}")
+
+            hub.register_sync_all_joins_callback(sync_joins_to_hub)
+            shrink_send_buffers(hub)
+            sim.pause_reading()
+            sim.request_sync()
+            await wait_for(lambda: hub.get_stats()["outbound_queued"] > 0)
+            await wait_for(lambda: hub._sync_task is None)
+            queued = hub.get_stats()["outbound_queued"]
+            hub.set_digital(5, True, crestron.PRIORITY_HIGH)
+            sim.resume_reading()
+            await sim.wait_received(1001)
+            position = sim.received.index((codec.DIGITAL, 5, True))
+            assert len(sim.received) - 1 - position >= queued
+            serials = [join for kind, join, _ in sim.received if kind == codec.SERIAL]
+            assert serials == list(range(1, 1001))
+
+    asyncio.run(run())
+
+
+def test_oversized_serial_payload_is_dropped():
+    async def run():
+        async with connected(max_serial=252) as (hub, sim):
+            dispatched = []
+            hub.register_callback(recorder(dispatched))
+            payload = "Café au lait, très bon ".encode() * 40
+            sim._send(b"\xc8\x00" + payload[:500])
+            await sim.drain()
+            await asyncio.sleep(0.05)
+            sim._send(payload[500:] + b"\xff" + codec.encode_digital(9, True))
+            await wait_bytes_in(hub, sim)
+            assert dispatched == [("d9", "1")]
+            assert hub.get_stats()["serial_errors"] == 1
+
+    asyncio.run(run())
+
+
+def test_pacer_limits_frame_rate():
+    async def run():
+        pacer = crestron.Pacer(frames_per_second=200, burst_frames=10)
+        async with connected(pacer=pacer, dedup=False) as (hub, sim):
+            start = time.perf_counter()
+            for value in range(60):
+                hub.set_analog(1, value)
+            await sim.wait_received(60)
+            elapsed = time.perf_counter() - start
+            # 10 frames of burst, the other 50 at 200/s
+            assert elapsed >= 0.2
+            assert [value for _, _, value in sim.received] == list(range(60))
+            assert hub.get_stats()["throttle_waits"] > 0
+
+    asyncio.run(run())
+
+
+def test_dedup_suppresses_repeated_values():
+    async def run():
+        async with connected() as (hub, sim):
+            hub.set_analog(1, 5)
+            hub.set_analog(1, 5)
+            hub.set_analog(1, 5, force=True)
+            await hub.set_digital_helper(2, True)
+            await hub.set_digital_helper(2, True)
+            await hub.set_digital_helper(2, True, force=True)
+            await sim.wait_received(4)
+            assert sim.received == [
+                (codec.ANALOG, 1, 5),
+                (codec.ANALOG, 1, 5),
+                (codec.DIGITAL, 2, True),
+                (codec.DIGITAL, 2, True),
+            ]
+            assert hub.get_stats()["outbound_suppressed"] == 2
+
+            # The control system changed the join: the same value goes out again
+            sim.send_analog(1, 7)
+            await wait_bytes_in(hub, sim)
+            hub.set_analog(1, 5)
+            await sim.wait_received(5)
+            assert sim.received[-1] == (codec.ANALOG, 1, 5)
+
+    asyncio.run(run())
+
+
+def test_resync_is_not_deduplicated():
+    async def run():
+        async with connected() as (hub, sim):
+
+            async def sync_joins_to_hub():
+                hub.set_analog(1, 5)
+
+            hub.register_sync_all_joins_callback(sync_joins_to_hub)
+            hub.set_analog(1, 5)
+            await sim.wait_received(1)
+            sim.request_sync()
+            await sim.wait_received(2)
+            assert sim.received == [(codec.ANALOG, 1, 5)] * 2
+
+    asyncio.run(run())
+
+
+def test_read_loop_yields_during_a_large_burst():
+    async def run():
+        async with connected(slice_frames=10) as (hub, sim):
+            dispatched = []
+            hub.register_callback(recorder(dispatched))
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            for value in range(2000):
+                sim.send_analog(value % 100 + 1, value)
+            await wait_bytes_in(hub, sim)
+            task.cancel()
+            # bytes_in only counts handled frames, so everything was dispatched by now
+            assert len(dispatched) == 2000
+            assert hub.get_stats()["frames_in_analog"] == 2000
+            assert hub.get_stats()["read_yields"] >= 2000 // 10 - 1
+            assert ticks > 0
+
+    asyncio.run(run())
+
+
+def test_conflation_keeps_digital_edges_and_latest_values():
+    async def run():
+        async with connected(conflate=True) as (hub, sim):
+            dispatched = []
+            hub.register_callback(recorder(dispatched, delay=0.001))
+            for value in range(200):
+                sim.send_analog(1, value)
+                if value % 20 == 0:
+                    sim.send_digital(2, value % 40 == 0)
+            await wait_bytes_in(hub, sim)
+            await wait_for(lambda: hub.get_stats()["inbound_pending"] == 0)
+            await wait_for(lambda: dispatched and dispatched[-1] == ("a1", "199"))
+            analog = [value for cbtype, value in dispatched if cbtype == "a1"]
+            edges = [value for cbtype, value in dispatched if cbtype == "d2"]
+            assert len(analog) < 200
+            assert analog == sorted(analog, key=int)
+            assert edges == ["1", "0"] * 5
+            assert hub.get_stats()["inbound_conflated"] > 0
+
+    asyncio.run(run())
+
+
+def test_callback_error_still_cleans_up_the_connection():
+    async def run():
+        async with connected() as (hub, sim):
+
+            async def process_callback(cbtype, value):
+                raise RuntimeError("entity update failed")
+
+            hub.register_callback(process_callback)
+            sim.send_digital(1, True)
+            await wait_for(lambda: not hub.is_available())
+            assert hub.get_stats()["connections"] == 0
+            # The control system sees the connection close and can reconnect
+            await asyncio.wait_for(sim._read_task, 5)
+
+    asyncio.run(run())
+
+
+def test_socket_timeout_still_cleans_up_the_connection():
+    class TimingOutReader:
+        """Fails the next read like a connection whose keepalive probes went unanswered"""
+
+        def __init__(self, reader):
+            self._reader = reader
+
+        async def read(self, size):
+            await self._reader.read(size)
+            raise TimeoutError(110, "Connection timed out")
+
+    async def run():
+        hub = crestron.CrestronXsig()
+        server = await asyncio.start_server(
+            lambda reader, writer: hub.handle_connection(TimingOutReader(reader), writer),
+            "127.0.0.1",
+            0,
+        )
+        port = server.sockets[0].getsockname()[1]
+        async with ControlSystemSimulator("127.0.0.1", port) as sim:
+            await sim.wait_update_requests()
+            assert hub.is_available()
+            sim.send_digital(1, True)
+            await wait_for(lambda: not hub.is_available())
+            assert hub.get_stats()["connections"] == 0
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(run())
+
+
+def test_warm_start_only_dispatches_changed_joins():
+    async def run():
+        hub = crestron.CrestronXsig()
+        data = snapshot.dump_snapshot({1: True}, {2: 100, 3: 200}, {4: "kept"})
+        hub.restore(*snapshot.load_snapshot(data))
+        # Entities get their last values before the control system connects
+        assert hub.get_analog(2) == 100
+        assert hub.get_serial(4) == "kept"
+        dispatched = []
+        hub.register_callback(recorder(dispatched))
+        await hub.listen(0)
+        sim = await connect_sim(
+            hub, digital={1: True}, analog={2: 100, 3: 250}, serial={4: "kept"}
+        )
+        try:
+            await wait_bytes_in(hub, sim)
+            assert dispatched == [("a3", "250")]
+            # After the dump, a repeated value is a real update again
+            sim.send_analog(2, 100)
+            await wait_bytes_in(hub, sim)
+            assert dispatched[-1] == ("a2", "100")
+        finally:
+            await sim.close()
+            await hub.stop()
+
+    asyncio.run(run())
+
+
+def test_bulk_load_fills_the_store_without_dispatching():
+    async def run():
+        hub = crestron.CrestronXsig(bulk_quiet_time=0.1)
+        dispatched = []
+        hub.register_callback(recorder(dispatched))
+        seen = availability_recorder(hub)
+        await hub.listen(0)
+        sim = await connect_sim(hub, analog={join: join * 10 for join in range(1, 101)})
+        try:
+            await wait_bytes_in(hub, sim)
+            assert not hub.is_available()
+            await wait_for(hub.is_available)
+            # One availability announcement instead of a dispatch per join
+            assert seen == [True]
+            assert dispatched == []
+            assert hub.get_analog(100) == 1000
+            sim.send_analog(1, 5)
+            await wait_bytes_in(hub, sim)
+            assert dispatched == [("a1", "5")]
+        finally:
+            await sim.close()
+            await hub.stop()
+
+    asyncio.run(run())
+
+
+def test_bulk_load_ends_after_max_frames():
+    async def run():
+        hub = crestron.CrestronXsig(bulk_quiet_time=30, bulk_max_frames=50)
+        await hub.listen(0)
+        sim = await connect_sim(hub, digital={join: True for join in range(1, 51)})
+        try:
+            await wait_for(hub.is_available, timeout=2)
+        finally:
+            await sim.close()
+            await hub.stop()
+
+    asyncio.run(run())
+
+
+def test_availability_delay_rides_out_a_quick_reconnect():
+    async def run():
+        hub = crestron.CrestronXsig(availability_delay=0.3)
+        seen = availability_recorder(hub)
+        await hub.listen(0)
+        sim = await connect_sim(hub)
+        await sim.close()
+        await wait_for(lambda: hub.get_stats()["connections"] == 0)
+        sim = await connect_sim(hub)
+        await asyncio.sleep(0.4)
+        assert hub.is_available()
+        assert seen == [True]
+        await sim.close()
+        await wait_for(lambda: not hub.is_available(), timeout=2)
+        assert seen == [True, False]
+        await hub.stop()
+
+    asyncio.run(run())
+
+
+def test_idle_timeout_closes_a_silent_connection():
+    async def run():
+        async with connected(idle_timeout=0.2) as (hub, sim):
+            # Traffic keeps the connection open
+            for value in range(8):
+                sim.send_analog(1, value)
+                await asyncio.sleep(0.05)
+            assert hub.is_available()
+            await asyncio.wait_for(sim._read_task, 2)
+            assert not hub.is_available()
+            assert hub.get_stats()["idle_timeouts"] == 1
+
+    asyncio.run(run())
+
+
+def test_keepalive_is_enabled_on_connections():
+    async def run():
+        async with connected(keepalive=(5, 2, 3)) as (hub, sim):
+            sock = next(iter(hub._connections)).get_extra_info("socket")
+            assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE)
+            if hasattr(socket, "TCP_KEEPCNT"):
+                assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT) == 3
+
+    asyncio.run(run())
+
+
+def test_multi_connection_fans_out_and_merges_last():
+    async def run():
+        async with connected(multi_connection=True) as (hub, first):
+            second = await connect_sim(hub)
+            try:
+                assert hub.get_stats()["connections"] == 2
+                hub.set_analog(1, 42)
+                await first.wait_received(1)
+                await second.wait_received(1)
+                assert first.received == second.received == [(codec.ANALOG, 1, 42)]
+                first.send_analog(2, 1)
+                await wait_bytes_in(hub, first, second)
+                second.send_analog(2, 2)
+                await wait_bytes_in(hub, first, second)
+                assert hub.get_analog(2) == 2
+                await second.close()
+                await wait_for(lambda: hub.get_stats()["connections"] == 1)
+                assert hub.is_available()
+            finally:
+                await second.close()
+
+    asyncio.run(run())
+
+
+def test_merge_first_ignores_later_connections():
+    async def run():
+        async with connected(multi_connection=True, merge=crestron.MERGE_FIRST) as (
+            hub,
+            first,
+        ):
+            second = await connect_sim(hub)
+            try:
+                second.send_analog(2, 99)
+                first.send_analog(2, 5)
+                await wait_for(lambda: hub.get_stats()["frames_in_analog"] == 2)
+                assert hub.get_analog(2) == 5
+            finally:
+                await second.close()
+
+    asyncio.run(run())
+
+
+def test_single_connection_is_replaced_by_a_new_one():
+    async def run():
+        async with connected() as (hub, first):
+            second = await connect_sim(hub)
+            try:
+                await asyncio.wait_for(first._read_task, 2)
+                assert hub.get_stats()["connections"] == 1
+                hub.set_digital(3, True)
+                await second.wait_received(1)
+                assert first.received == []
+            finally:
+                await second.close()
+
+    asyncio.run(run())
+
+
+def test_standby_takes_over_when_the_primary_is_lost():
+    async def run():
+        async with connected(standby=True, analog={1: 10}) as (hub, primary):
+
+            async def sync_joins_to_hub():
+                hub.set_analog(5, 500)
+
+            hub.register_sync_all_joins_callback(sync_joins_to_hub)
+            seen = availability_recorder(hub)
+            standby = await connect_sim(hub, analog={1: 20})
+            try:
+                await wait_bytes_in(hub, primary, standby)
+                # A standby's joins go into its own store and it gets no outbound joins
+                assert hub.get_analog(1) == 10
+                hub.set_analog(6, 600)
+                await primary.wait_received(1)
+                await primary.close()
+                await wait_for(lambda: hub.get_stats()["failovers"] == 1)
+                assert hub.is_available()
+                assert False not in seen
+                assert hub.get_analog(1) == 20
+                # Everything is pushed to the promoted standby
+                await standby.wait_received(1)
+                assert standby.received == [(codec.ANALOG, 5, 500)]
+                hub.set_analog(6, 601)
+                await standby.wait_received(2)
+                assert standby.received[-1] == (codec.ANALOG, 6, 601)
+                # Its frames now update the hub's joins
+                standby.send_analog(1, 21)
+                await wait_for(lambda: hub.get_analog(1) == 21)
+            finally:
+                await standby.close()
+
+    asyncio.run(run())
@@ -0,0 +1,79 @@
+"""Both profiling modes, run against a busy codec loop on the event loop thread"""
+
+import asyncio
+import os
+import pstats
+from types import SimpleNamespace
+
+from tools._component import load
+
+codec = load("codec")
+profiler = load("profiler")
+
+FRAMES = b"".join(codec.encode_analog(join, join) for join in range(1, 1001))
+
+
+class FakeHass:
+    """Just what CrestronProfiler uses of HomeAssistant"""
+
+    def __init__(self, config_dir):
+        self.config = SimpleNamespace(path=lambda name: os.path.join(config_dir, name))
+
+    async def async_add_executor_job(self, target, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, target, *args)
+
+
+async def _decode_forever():
+    # Long runs between yields: the sampler thread mostly gets the GIL when the loop idles
+    while True:
+        for _ in range(50):
+            offset = 0
+            while (frame := codec.decode_frame(FRAMES, offset)) is not None:
+                offset = frame[3]
+        await asyncio.sleep(0)
+
+
+async def _profile(tmp_path, mode):
+    busy = asyncio.create_task(_decode_forever())
+    try:
+        return await profiler.CrestronProfiler(FakeHass(str(tmp_path))).profile(
+            mode, 0.3, 0.001
+        )
+    finally:
+        busy.cancel()
+
+
+def test_cprofile_mode_keeps_component_functions(tmp_path):
+    path = asyncio.run(_profile(tmp_path, profiler.MODE_CPROFILE))
+    assert path.endswith(".prof")
+    stats = pstats.Stats(path).stats
+    files = {filename for filename, _, _ in stats}
+    assert os.path.join(profiler.COMPONENT_DIR, "codec.py") in files
+    for (filename, _, _), (_, _, _, _, callers) in stats.items():
+        # Everything kept is ours or called by our code
+        assert filename.startswith(profiler.COMPONENT_DIR) or any(
+            caller[0].startswith(profiler.COMPONENT_DIR) for caller in callers
+        )
+
+
+def test_sample_mode_writes_collapsed_stacks(tmp_path):
+    path = asyncio.run(_profile(tmp_path, profiler.MODE_SAMPLE))
+    assert path.endswith(".collapsed")
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0
+    assert any("codec:decode_frame" in line for line in lines)
+
+
+def test_one_session_at_a_time(tmp_path):
+    async def run():
+        hub_profiler = profiler.CrestronProfiler(FakeHass(str(tmp_path)))
+        first = asyncio.create_task(hub_profiler.profile(profiler.MODE_SAMPLE, 0.1, 0.01))
+        await asyncio.sleep(0)
+        assert await hub_profiler.profile(profiler.MODE_SAMPLE, 0.1, 0.01) is None
+        assert await first is not None
+
+    asyncio.run(run())
@@ -0,0 +1,22 @@
+"""Tests for the join snapshot file format"""
+
+from tools._component import load
+
+snapshot = load("snapshot")
+
+
+def test_round_trip():
+    digital = {1: True, 2: False}
+    analog = {3: 0, 4: 65535}
+    serial = {5: "", 6: "Now playing: Ünïcødé ♫"}
+    data = snapshot.dump_snapshot(digital, analog, serial)
+    assert snapshot.load_snapshot(data) == (digital, analog, serial)
+
+
+def test_long_serial_is_truncated():
+    data = snapshot.dump_snapshot({}, {}, {1: "é" * 40000, 2: "x"})
+    _, _, serial = snapshot.load_snapshot(data)
+    encoded = serial[1].encode()
+    assert len(encoded) <= snapshot.MAX_SNAPSHOT_SERIAL
+    assert serial[1] == "é" * (len(encoded) // 2)
+    assert serial[2] == "x"
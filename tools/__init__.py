@@ -0,0 +1 @@
+"""Development tools for the Crestron XSIG integration (run with python -m tools.<name>)"""
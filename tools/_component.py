@@ -0,0 +1,22 @@
+"""Import the XSIG protocol modules of the integration without importing Home Assistant"""
+
+import importlib
+import os
+import sys
+import types
+
+COMPONENT_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "custom_components",
+    "crestron",
+)
+PACKAGE = "crestron_xsig"
+
+
+def load(name):
+    """Return custom_components/crestron/<name>.py as a module (skipping the package __init__)"""
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [COMPONENT_DIR]
+        sys.modules[PACKAGE] = package
+    return importlib.import_module(f"{PACKAGE}.{name}")
@@ -0,0 +1,321 @@
+"""End-to-end throughput and latency benchmarks for the XSIG server
+
+Runs a local CrestronXsig against the control system simulator and saves the results as JSON
+so runs from different versions can be compared:
+
+    python -m tools.xsig_bench -o before.json
+    python -m tools.xsig_bench -o after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import time
+import timeit
+
+from ._component import COMPONENT_DIR, load
+from .xsig_simulator import ControlSystemSimulator
+
+codec = load("codec")
+crestron = load("crestron")
+
+ENTITY_COUNTS = (10, 100, 1000)
+
+
+def _entity_callback():
+    async def process_callback(cbtype, value):
+        pass
+
+    return process_callback
+
+
+async def _start_hub(entities=0, dedup=True):
+    hub = crestron.CrestronXsig(dedup=dedup)
+    for _ in range(entities):
+        hub.register_callback(_entity_callback())
+    await hub.listen(0)
+    return hub, hub._server.sockets[0].getsockname()[1]
+
+
+async def _stop_hub(hub, sim):
+    await sim.close()
+    while hub.is_available():
+        await asyncio.sleep(0.001)
+    await hub.stop()
+
+
+async def _wait_bytes_in(hub, count):
+    while hub.get_stats()["bytes_in"] < count:
+        await asyncio.sleep(0)
+
+
+async def bench_inbound(entities, frames):
+    """Frames/sec from the socket through handle_connection to every entity callback"""
+    hub, port = await _start_hub(entities)
+    sim = ControlSystemSimulator("127.0.0.1", port)
+    await sim.connect()
+    await sim.wait_update_requests()
+    start = time.perf_counter()
+    for i in range(frames):
+        join = i % 1000 + 1
+        kind = i % 3
+        if kind == 0:
+            sim.send_digital(join, i & 1)
+        elif kind == 1:
+            sim.send_analog(join, i & 0xFFFF)
+        else:
+            sim.send_serial(join, f"value {i}")
+        if i % 1000 == 999:
+            await sim.drain()
+    await sim.drain()
+    await _wait_bytes_in(hub, sim.bytes_sent)
+    elapsed = time.perf_counter() - start
+    await _stop_hub(hub, sim)
+    return {
+        "entities": entities,
+        "frames": frames,
+        "seconds": elapsed,
+        "frames_per_sec": frames / elapsed,
+    }
+
+
+async def bench_outbound(frames):
+    """Encode/write rate of set_digital/set_analog/set_serial, and until the simulator has them all"""
+    # Joins repeat every 1000 frames; with dedup some repeats would never be sent
+    hub, port = await _start_hub(dedup=False)
+    sim = ControlSystemSimulator("127.0.0.1", port)
+    await sim.connect()
+    await sim.wait_update_requests()
+    start = time.perf_counter()
+    for i in range(frames):
+        join = i % 1000 + 1
+        kind = i % 3
+        if kind == 0:
+            hub.set_digital(join, bool(i & 1))
+        elif kind == 1:
+            hub.set_analog(join, i & 0xFFFF)
+        else:
+            hub.set_serial(join, f"value {i}")
+    encoded = time.perf_counter() - start
+    await sim.wait_received(frames, timeout=60)
+    delivered = time.perf_counter() - start
+    await _stop_hub(hub, sim)
+    return {
+        "frames": frames,
+        "encode_seconds": encoded,
+        "encode_frames_per_sec": frames / encoded,
+        "delivered_seconds": delivered,
+        "delivered_frames_per_sec": frames / delivered,
+    }
+
+
+async def bench_sync(to_joins):
+    """Time from an 0xFB request until the simulator has received all to_joins
+
+    Values are pre-rendered: this measures the XSIG side of sync_joins_to_hub, not Jinja.
+    """
+    hub, port = await _start_hub()
+    values = []
+    for i in range(to_joins):
+        join = i // 3 + 1
+        kind = i % 3
+        values.append((kind, join, i))
+
+    async def sync_joins_to_hub():
+        for kind, join, value in values:
+            if kind == 0:
+                hub.set_digital(join, bool(value & 1))
+            elif kind == 1:
+                hub.set_analog(join, value & 0xFFFF)
+            else:
+                hub.set_serial(join, str(value))
+
+    hub.register_sync_all_joins_callback(sync_joins_to_hub)
+    sim = ControlSystemSimulator("127.0.0.1", port)
+    await sim.connect()
+    await sim.wait_update_requests()
+    start = time.perf_counter()
+    sim.request_sync()
+    await sim.wait_received(to_joins, timeout=60)
+    elapsed = time.perf_counter() - start
+    await _stop_hub(hub, sim)
+    return {"to_joins": to_joins, "seconds": elapsed}
+
+
+async def bench_latency(entities, frames, rate):
+    """Latency from the simulator writing a frame until every entity callback has seen it"""
+    hub = crestron.CrestronXsig()
+    calls = {}
+    done = {}
+
+    def make_callback():
+        async def process_callback(cbtype, value):
+            if cbtype == "a1":
+                count = calls.get(value, 0) + 1
+                calls[value] = count
+                if count == entities:
+                    done[value] = time.perf_counter()
+
+        return process_callback
+
+    for _ in range(entities):
+        hub.register_callback(make_callback())
+    await hub.listen(0)
+    port = hub._server.sockets[0].getsockname()[1]
+    sim = ControlSystemSimulator("127.0.0.1", port)
+    await sim.connect()
+    await sim.wait_update_requests()
+    sent = {}
+    interval = 1 / rate
+    start = time.perf_counter()
+    for i in range(frames):
+        value = i & 0xFFFF
+        sent[str(value)] = time.perf_counter()
+        sim.send_analog(1, value)
+        delay = start + (i + 1) * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    await sim.drain()
+    await _wait_bytes_in(hub, sim.bytes_sent)
+    await _stop_hub(hub, sim)
+    latencies = sorted((done[value] - sent[value]) * 1000 for value in done)
+    percentiles = statistics.quantiles(latencies, n=100)
+    return {
+        "entities": entities,
+        "frames": len(latencies),
+        "rate": rate,
+        "p50_ms": percentiles[49],
+        "p90_ms": percentiles[89],
+        "p99_ms": percentiles[98],
+        "max_ms": latencies[-1],
+    }
+
+
+def bench_codec(number):
+    """ns/frame to encode and decode each frame type"""
+    serial = "Now playing: Song title - Artist".encode()
+    frames = {
+        "digital": (lambda: codec.encode_digital(1234, True), codec.encode_digital(1234, True)),
+        "analog": (lambda: codec.encode_analog(567, 54321), codec.encode_analog(567, 54321)),
+        "serial": (lambda: codec.encode_serial(89, serial), codec.encode_serial(89, serial)),
+    }
+    results = {}
+    for kind, (encode, data) in frames.items():
+        buffer = bytearray(data)
+        encode_ns = min(timeit.repeat(encode, number=number, repeat=5)) / number * 1e9
+        decode_ns = (
+            min(timeit.repeat(lambda: codec.decode_frame(buffer, 0), number=number, repeat=5))
+            / number
+            * 1e9
+        )
+        results[kind] = {"encode_ns": encode_ns, "decode_ns": decode_ns}
+    return results
+
+
+async def run(args):
+    results = {}
+    results["codec"] = bench_codec(args.codec_number)
+    results["inbound"] = [
+        await bench_inbound(entities, args.frames) for entities in ENTITY_COUNTS
+    ]
+    results["outbound"] = await bench_outbound(args.frames)
+    results["sync_joins_to_hub"] = [
+        await bench_sync(count) for count in (100, 1000, 3000)
+    ]
+    results["dispatch_latency"] = [
+        await bench_latency(entities, args.latency_frames, args.latency_rate)
+        for entities in ENTITY_COUNTS
+    ]
+    return results
+
+
+def _metadata():
+    with open(os.path.join(COMPONENT_DIR, "manifest.json")) as f:
+        version = json.load(f)["version"]
+    return {
+        "version": version,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def _print(results):
+    for kind, result in results["codec"].items():
+        print(
+            f"codec     {kind:>7}: encode {result['encode_ns']:>7.0f} ns/frame, "
+            f"decode {result['decode_ns']:>7.0f} ns/frame"
+        )
+    for result in results["inbound"]:
+        print(
+            f"inbound   {result['entities']:>5} entities: {result['frames_per_sec']:>10.0f} frames/sec"
+        )
+    outbound = results["outbound"]
+    print(
+        f"outbound  encode+write: {outbound['encode_frames_per_sec']:>10.0f} frames/sec, "
+        f"delivered: {outbound['delivered_frames_per_sec']:.0f} frames/sec"
+    )
+    for result in results["sync_joins_to_hub"]:
+        print(f"sync      {result['to_joins']:>5} to_joins: {result['seconds'] * 1000:>10.1f} ms")
+    for result in results["dispatch_latency"]:
+        print(
+            f"latency   {result['entities']:>5} entities: p50 {result['p50_ms']:.3f} ms, "
+            f"p90 {result['p90_ms']:.3f} ms, p99 {result['p99_ms']:.3f} ms"
+        )
+
+
+def _compare(results, baseline):
+    """Print the change in the headline numbers against a previous results file"""
+    print(f"\nCompared to {baseline['metadata']['version']} ({baseline['metadata']['timestamp']}):")
+    old = baseline["results"]
+    for kind, result in results["codec"].items():
+        if kind in old.get("codec", {}):
+            encode = result["encode_ns"] / old["codec"][kind]["encode_ns"] - 1
+            decode = result["decode_ns"] / old["codec"][kind]["decode_ns"] - 1
+            print(f"codec     {kind:>7}: encode {encode:+.1%}, decode {decode:+.1%}")
+    for new_result, old_result in zip(results["inbound"], old["inbound"]):
+        change = new_result["frames_per_sec"] / old_result["frames_per_sec"] - 1
+        print(f"inbound   {new_result['entities']:>5} entities: {change:+.1%} frames/sec")
+    change = (
+        results["outbound"]["encode_frames_per_sec"]
+        / old["outbound"]["encode_frames_per_sec"]
+        - 1
+    )
+    print(f"outbound  encode+write: {change:+.1%} frames/sec")
+    for new_result, old_result in zip(results["sync_joins_to_hub"], old["sync_joins_to_hub"]):
+        change = new_result["seconds"] / old_result["seconds"] - 1
+        print(f"sync      {new_result['to_joins']:>5} to_joins: {change:+.1%} time")
+    for new_result, old_result in zip(results["dispatch_latency"], old["dispatch_latency"]):
+        change = new_result["p99_ms"] / old_result["p99_ms"] - 1
+        print(f"latency   {new_result['entities']:>5} entities: {change:+.1%} p99")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", help="JSON results file (default xsig_bench_<version>.json)")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--frames", type=int, default=30000, help="frames per throughput run")
+    parser.add_argument("--codec-number", type=int, default=200000, help="iterations per codec microbenchmark")
+    parser.add_argument("--latency-frames", type=int, default=2000, help="frames per latency run")
+    parser.add_argument("--latency-rate", type=float, default=1000, help="frames/sec for latency runs")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    metadata = _metadata()
+    results = asyncio.run(run(args))
+    _print(results)
+    output = args.output or f"xsig_bench_{metadata['version']}.json"
+    with open(output, "w") as f:
+        json.dump({"metadata": metadata, "results": results}, f, indent=2)
+    print(f"\nResults written to {output}")
+    if args.compare:
+        with open(args.compare) as f:
+            _compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""Round-trip and fuzz checks for the XSIG codec
+
+Checks that every join/value encodes and decodes back to itself (exhaustively over the join
+ranges and over the full analog value range, randomly for mixed streams split at arbitrary
+read boundaries) and that malformed or truncated input never raises unexpectedly, never
+stalls the decoder and never turns into a frame that was not sent:
+
+    python -m tools.xsig_codec_check
+    python -m tools.xsig_codec_check --iterations 100000 --seed 7
+"""
+
+import argparse
+import random
+import sys
+
+from ._component import load
+
+codec = load("codec")
+
+SERIAL_SAMPLES = [
+    "",
+    "a",
+    "Now playing: Ünïcødé ♫",
+    "日本語テキスト",
+    "emoji 🎵🎶",
+    "x" * codec.MAX_SERIAL_LENGTH,
+    "é" * (codec.MAX_SERIAL_LENGTH // 2),
+]
+
+# Malformed and truncated streams: (name, bytes, frames expected before the stream stops decoding)
+CORPUS = [
+    ("empty", b"", 0),
+    ("lone digital header", b"\x80", 0),
+    ("lone analog header", b"\xc0", 0),
+    ("analog missing value", b"\xc0\x00\x01", 0),
+    ("serial without terminator", b"\xc8\x00hello", 0),
+    ("serial header only", b"\xc8", 0),
+    ("second byte high bit", b"\x80\x80\x80\x00", 1),
+    ("ascii noise", b"hello world", 0),
+    ("terminator noise", b"\xff\xff\xff", 0),
+    ("update request echoed", b"\xfd\x80\x00", 1),
+    ("sync all", b"\xfb\xfb\xfb", 3),
+    ("analog with high bits in value bytes", b"\xc0\x00\xff\xff", 0),
+    ("digital then truncated analog", b"\x80\x00\xc0\x00\x01", 1),
+    ("serial with embedded header bytes", b"\xc8\x00\x80\x00\xff", 0),
+    ("serial invalid utf-8", b"\xc8\x00\xc3\x28\xff\x80\x00", 1),
+    ("max joins", b"\x9f\x7f\xc7\x7f\x7f\x7f\xcf\x7f\xff", 3),
+]
+
+# Serial payloads over max_serial: (name, bytes, encoding, frames that were really sent after it).
+# Non-ASCII text is the interesting case: its bytes look like frame headers once decoding
+# loses track of the payload.
+OVERSIZED_CORPUS = [
+    (
+        "utf-8 text",
+        b"\xc8\x00" + "Café au lait, très bon ".encode() * 20 + b"\xff" + codec.encode_digital(9, True),
+        "utf-8",
+        [(codec.DIGITAL, 9, True)],
+    ),
+    (
+        "utf-8 text, terminator lost",
+        b"\xc8\x00" + "Café au lait, très bon ".encode() * 20 + codec.encode_digital(9, True),
+        "utf-8",
+        [],
+    ),
+    (
+        "latin-1 text",
+        b"\xc8\x00" + "À la carte ±5 ".encode("latin-1") * 30 + b"\xff" + codec.encode_analog(3, 7),
+        "latin-1",
+        [(codec.ANALOG, 3, 7)],
+    ),
+    (
+        "cp1252 text, then more serials",
+        b"\xc8\x00"
+        + "Ça coûte 5€ ±1 ".encode("cp1252") * 30
+        + b"\xff"
+        + codec.encode_serial(2, "Ça".encode("cp1252")),
+        "cp1252",
+        [(codec.SERIAL, 2, "Ça")],
+    ),
+]
+
+
+def _frame(kind, join, value):
+    if kind == codec.DIGITAL:
+        return codec.encode_digital(join, value)
+    if kind == codec.ANALOG:
+        return codec.encode_analog(join, value)
+    return codec.encode_serial(join, value.encode())
+
+
+def _decode_all(data, chunks=None, **options):
+    """Decode a stream fed in the given chunk sizes, like the hub's read loop"""
+    frames = []
+    buffer = bytearray()
+    chunks = chunks or [len(data)]
+    position = 0
+    skipping = False
+    for size in chunks:
+        buffer += data[position : position + size]
+        position += size
+        offset = 0
+        while True:
+            if skipping:
+                next_offset = codec.skip_serial(buffer, offset)
+                if next_offset is None:
+                    offset = len(buffer)
+                    break
+                offset = next_offset
+                skipping = False
+            frame = codec.decode_frame(buffer, offset, **options)
+            if frame is None:
+                break
+            kind, join, value, next_offset = frame
+            assert next_offset > offset, f"decoder stalled at {offset} in {data!r}"
+            frames.append((kind, join, value))
+            skipping = kind == codec.SERIAL_OVERSIZED and value is True
+            offset = next_offset
+        del buffer[:offset]
+        if "max_serial" in options:
+            # Bounded: a frame still waiting for its end never holds more than max_serial bytes
+            assert len(buffer) <= options["max_serial"] + 2, (data, len(buffer))
+    return frames
+
+
+def check_round_trip(rng):
+    for join in range(1, codec.MAX_DIGITAL_JOIN + 1):
+        for value in (True, False):
+            data = codec.encode_digital(join, value)
+            assert codec.decode_frame(data) == (codec.DIGITAL, join, value, 2), (join, value)
+    for join in range(1, codec.MAX_ANALOG_JOIN + 1):
+        for value in (0, 1, 0x3FFF, 0x4000, 0x7FFF, 0x8000, 0xC000, codec.MAX_ANALOG_VALUE):
+            data = codec.encode_analog(join, value)
+            assert codec.decode_frame(data) == (codec.ANALOG, join, value, 4), (join, value)
+    for join in (1, 2, 128, 129, codec.MAX_ANALOG_JOIN, rng.randint(1, codec.MAX_ANALOG_JOIN)):
+        for value in range(codec.MAX_ANALOG_VALUE + 1):
+            data = codec.encode_analog(join, value)
+            assert codec.decode_frame(data) == (codec.ANALOG, join, value, 4), (join, value)
+    for join in range(1, codec.MAX_SERIAL_JOIN + 1):
+        for string in SERIAL_SAMPLES:
+            data = codec.encode_serial(join, string.encode())
+            assert codec.decode_frame(data) == (codec.SERIAL, join, string, len(data)), (join, string)
+
+
+def check_truncation():
+    frames = [
+        codec.encode_digital(4096, True),
+        codec.encode_analog(1024, 0xC001),
+        codec.encode_serial(77, "héllo".encode()),
+    ]
+    for data in frames:
+        for end in range(len(data)):
+            assert codec.decode_frame(data[:end]) is None, data[:end]
+
+
+def check_utf8_truncation():
+    for string in SERIAL_SAMPLES + ["é" * 200, "日本" * 100, "🎵" * 80, "a" + "é" * 200]:
+        data = string.encode()
+        for limit in range(0, codec.MAX_SERIAL_LENGTH + 1):
+            cut = codec.truncate_utf8(data, limit)
+            assert len(cut) <= limit, (string, limit)
+            # Never splits a character, and keeps every character that fits
+            decoded = cut.decode("utf-8")
+            assert string.startswith(decoded), (string, limit)
+            if len(decoded) < len(string):
+                assert len(cut) + len(string[len(decoded)].encode()) > limit, (string, limit)
+
+
+def check_streams(rng, iterations):
+    for _ in range(iterations):
+        expected = []
+        for _ in range(rng.randint(1, 20)):
+            kind = rng.choice((codec.DIGITAL, codec.ANALOG, codec.SERIAL))
+            if kind == codec.DIGITAL:
+                frame = (kind, rng.randint(1, codec.MAX_DIGITAL_JOIN), rng.random() < 0.5)
+            elif kind == codec.ANALOG:
+                frame = (kind, rng.randint(1, codec.MAX_ANALOG_JOIN), rng.randint(0, codec.MAX_ANALOG_VALUE))
+            else:
+                frame = (kind, rng.randint(1, codec.MAX_SERIAL_JOIN), rng.choice(SERIAL_SAMPLES))
+            expected.append(frame)
+        data = b"".join(_frame(*frame) for frame in expected)
+        chunks = []
+        remaining = len(data)
+        while remaining:
+            size = rng.randint(1, max(1, remaining))
+            chunks.append(size)
+            remaining -= size
+        assert _decode_all(data, chunks) == expected, (expected, chunks)
+
+
+def check_corpus():
+    skipped = (None, codec.SERIAL_INVALID, codec.SERIAL_OVERSIZED)
+    for name, data, frames in CORPUS:
+        decoded = [frame for frame in _decode_all(data) if frame[0] not in skipped]
+        assert len(decoded) == frames, (name, decoded)
+    for name, data, encoding, sent in OVERSIZED_CORPUS:
+        for chunk in (1, 7, 64, len(data)):
+            frames = _decode_all(
+                data,
+                [chunk] * (len(data) // chunk + 1),
+                max_serial=codec.MAX_SERIAL_LENGTH,
+                encoding=encoding,
+            )
+            assert frames[0][0] == codec.SERIAL_OVERSIZED, (name, chunk, frames)
+            decoded = [frame for frame in frames if frame[0] not in skipped]
+            assert decoded == sent, (name, chunk, decoded)
+
+
+def check_serial_policies(rng):
+    """Bad serial payloads are skipped (or replaced) and decoding carries on after them"""
+    after = codec.encode_digital(9, True)
+    invalid = b"\xc8\x00\xc3\x28\xff" + after
+    assert _decode_all(invalid)[0][0] == codec.SERIAL_INVALID
+    assert _decode_all(invalid, errors="replace")[0] == (codec.SERIAL, 1, "\ufffd(")
+    assert _decode_all("é".encode("latin-1").join((b"\xc8\x00", b"\xff")), encoding="latin-1") == [
+        (codec.SERIAL, 1, "é")
+    ]
+    # Too long: skip up to the terminator, resync on the frames that follow
+    for max_serial in (4, 16, 252):
+        data = b"\xc8\x00" + b"x" * (max_serial + 1) + b"\xff" + after
+        frames = _decode_all(data, [1] * len(data), max_serial=max_serial)
+        assert frames[0][0] == codec.SERIAL_OVERSIZED, (max_serial, frames)
+        assert frames[-1] == (codec.DIGITAL, 9, True), (max_serial, frames)
+        string = "y" * max_serial
+        frame = codec.encode_serial(3, string.encode())
+        assert _decode_all(frame, max_serial=max_serial) == [(codec.SERIAL, 3, string)]
+    for _ in range(1000):
+        data = bytes(rng.randrange(256) for _ in range(rng.randint(1, 300)))
+        size = rng.randint(1, 32)
+        _decode_all(data, [size] * (len(data) // size + 1), max_serial=rng.randint(1, 64))
+
+
+def check_fuzz(rng, iterations):
+    """Random bytes and mutated valid streams: the decoder must only ever advance"""
+    for _ in range(iterations):
+        if rng.random() < 0.5:
+            data = bytes(rng.randrange(256) for _ in range(rng.randint(1, 64)))
+        else:
+            data = bytearray(
+                codec.encode_digital(rng.randint(1, 4096), True)
+                + codec.encode_analog(rng.randint(1, 1024), rng.randint(0, 0xFFFF))
+                + codec.encode_serial(rng.randint(1, 1024), b"fuzz")
+            )
+            for _ in range(rng.randint(1, 4)):
+                data[rng.randrange(len(data))] = rng.randrange(256)
+            data = bytes(data[: rng.randint(1, len(data))])
+        for kind, join, value in _decode_all(data):
+            if kind in (codec.DIGITAL, codec.ANALOG, codec.SERIAL):
+                # Anything decoded must re-encode into bytes that are in the input
+                assert _frame(kind, join, value) in data, (data, kind, join, value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    checks = [
+        ("round trip", lambda: check_round_trip(rng)),
+        ("truncation", check_truncation),
+        ("utf-8 truncation", check_utf8_truncation),
+        ("streams", lambda: check_streams(rng, args.iterations)),
+        ("corpus", check_corpus),
+        ("serial policies", lambda: check_serial_policies(rng)),
+        ("fuzz", lambda: check_fuzz(rng, args.iterations)),
+    ]
+    failed = False
+    for name, check in checks:
+        try:
+            check()
+        except AssertionError as err:
+            failed = True
+            print(f"FAIL {name}: {err}")
+        else:
+            print(f"ok   {name}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
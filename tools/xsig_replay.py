@@ -0,0 +1,137 @@
+"""Replay the control system side of an XSIG capture file
+
+By default a local CrestronXsig is started on an ephemeral port and the capture is fed into it,
+which is handy for benchmarking parser/dispatch changes against real traffic:
+
+    python -m tools.xsig_replay crestron_capture.xcap --fast
+
+Use --host/--port to replay into a running Home Assistant instead.
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from ._component import load
+
+capture = load("capture")
+crestron = load("crestron")
+
+
+async def _discard(reader):
+    """Swallow whatever the hub sends back so its socket buffer never fills"""
+    while await reader.read(65536):
+        pass
+
+
+def _entity_callback():
+    async def process_callback(cbtype, value):
+        pass
+
+    return process_callback
+
+
+async def replay(path, host=None, port=None, speed=1.0, callbacks=0):
+    """Replay inbound records of a capture. speed=0 sends as fast as possible."""
+    records = [
+        (t, data)
+        for t, direction, data in capture.read_capture(path)
+        if direction == capture.DIRECTION_IN
+    ]
+    hub = None
+    if port is None:
+        hub = crestron.CrestronXsig()
+        for _ in range(callbacks):
+            hub.register_callback(_entity_callback())
+        await hub.listen(0)
+        host = "127.0.0.1"
+        port = hub._server.sockets[0].getsockname()[1]
+
+    reader, writer = await asyncio.open_connection(host, port)
+    drain_task = asyncio.create_task(_discard(reader))
+    sent = 0
+    start = time.perf_counter()
+    for t, data in records:
+        if speed:
+            delay = t / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await writer.drain()
+                await asyncio.sleep(delay)
+        writer.write(data)
+        sent += len(data)
+        if writer.transport.get_write_buffer_size() > 65536:
+            await writer.drain()
+    await writer.drain()
+
+    result = {"records": len(records), "bytes": sent}
+    if hub is not None:
+        # Wait for the hub to handle everything that was sent (a capture cut off mid-frame
+        # leaves a partial frame that is never handled)
+        handled = 0
+        progress = time.perf_counter()
+        while handled < sent:
+            await asyncio.sleep(0.001)
+            bytes_in = hub.get_stats()["bytes_in"]
+            if bytes_in != handled:
+                handled = bytes_in
+                progress = time.perf_counter()
+            elif time.perf_counter() - progress > 1:
+                break
+        elapsed = progress - start
+        stats = hub.get_stats()
+        frames = (
+            stats["frames_in_digital"]
+            + stats["frames_in_analog"]
+            + stats["frames_in_serial"]
+        )
+        result.update(
+            {
+                "elapsed": elapsed,
+                "frames": frames,
+                "frames_per_sec": frames / elapsed if elapsed else 0,
+                "stats": stats,
+            }
+        )
+    else:
+        result["elapsed"] = time.perf_counter() - start
+
+    writer.close()
+    await writer.wait_closed()
+    drain_task.cancel()
+    if hub is not None:
+        # Let the hub's read loop see the disconnect before shutting down
+        while hub.is_available():
+            await asyncio.sleep(0.001)
+        await hub.stop()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", help="capture file written by crestron.capture_start")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="replay into a running hub instead of a local one")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed factor (default 1 = original timing)")
+    parser.add_argument("--fast", action="store_true", help="send as fast as possible")
+    parser.add_argument("--callbacks", type=int, default=0, help="no-op entity callbacks to register on the local hub")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+
+    result = asyncio.run(
+        replay(
+            args.capture,
+            args.host,
+            args.port,
+            0 if args.fast else args.speed,
+            args.callbacks,
+        )
+    )
+    print(f"Replayed {result['records']} records ({result['bytes']} bytes) in {result['elapsed']:.3f}s")
+    if "frames" in result:
+        print(f"{result['frames']} frames, {result['frames_per_sec']:.0f} frames/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""Stand-in for a Crestron control system talking to the XSIG server
+
+Connects to CrestronXsig.listen like a TCP/IP Client + XSIG symbol would: answers the hub's
+update request (0xFD) with a join dump, can ask the hub to resend everything (0xFB), generates
+digital/analog/serial traffic at a controlled rate and records every frame the hub sends.
+
+From a test or benchmark:
+
+    async with ControlSystemSimulator("127.0.0.1", port, analog={1: 100}) as sim:
+        sim.send_digital(5, True)
+        await sim.wait_received(1)
+
+As a load generator against a running Home Assistant:
+
+    python -m tools.xsig_simulator --port 16384 --rate 2000 --duration 30
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import socket
+import time
+
+from ._component import load
+
+codec = load("codec")
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ControlSystemSimulator:
+    def __init__(self, host, port, digital=None, analog=None, serial=None, recv_buffer=None):
+        """digital/analog/serial are the join values dumped when the hub sends 0xFD
+
+        recv_buffer sets the socket receive buffer (bytes), so a paused simulator backs up
+        the hub's writes after a few KB instead of a few MB.
+        """
+        self.host = host
+        self.port = port
+        self.recv_buffer = recv_buffer
+        self.digital = dict(digital or {})
+        self.analog = dict(analog or {})
+        self.serial = dict(serial or {})
+        # Frames received from the hub as ("d"|"a"|"s", join, value)
+        self.received = []
+        self.update_requests = 0
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._received_event = asyncio.Event()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def connect(self):
+        if self.recv_buffer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        else:
+            # The receive buffer has to be set before connecting to limit the TCP window
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.recv_buffer)
+            sock.setblocking(False)
+            try:
+                await asyncio.get_running_loop().sock_connect(sock, (self.host, self.port))
+            except OSError:
+                sock.close()
+                raise
+            self._reader, self._writer = await asyncio.open_connection(sock=sock)
+        self._read_task = asyncio.create_task(self._read_loop())
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+        if self._read_task is not None:
+            await asyncio.gather(self._read_task, return_exceptions=True)
+        self._writer = None
+        self._read_task = None
+
+    def _send(self, data):
+        self._writer.write(data)
+        self.frames_sent += 1
+        self.bytes_sent += len(data)
+
+    def send_digital(self, join, value):
+        self.digital[join] = bool(value)
+        self._send(codec.encode_digital(join, value))
+
+    def send_analog(self, join, value):
+        self.analog[join] = value
+        self._send(codec.encode_analog(join, value))
+
+    def send_serial(self, join, string):
+        self.serial[join] = string
+        self._send(codec.encode_serial(join, string.encode()))
+
+    def send_dump(self):
+        """Send every configured join, as the processor does after an update request"""
+        for join, value in self.digital.items():
+            self.send_digital(join, value)
+        for join, value in self.analog.items():
+            self.send_analog(join, value)
+        for join, string in self.serial.items():
+            self.send_serial(join, string)
+
+    def request_sync(self):
+        """Ask the hub to resend all of its to_joins (0xFB)"""
+        self._writer.write(bytes((codec.SYNC_ALL_BYTE,)))
+        self.bytes_sent += 1
+
+    async def drain(self):
+        await self._writer.drain()
+
+    def pause_reading(self):
+        """Stop reading from the hub, like a processor that cannot keep up"""
+        self._writer.transport.pause_reading()
+
+    def resume_reading(self):
+        self._writer.transport.resume_reading()
+
+    async def wait_received(self, count, timeout=5):
+        """Wait until at least count frames have been received from the hub"""
+        async with asyncio.timeout(timeout):
+            while len(self.received) < count:
+                self._received_event.clear()
+                await self._received_event.wait()
+
+    async def wait_update_requests(self, count=1, timeout=5):
+        """Wait until the hub has sent count update requests (0xFD)"""
+        async with asyncio.timeout(timeout):
+            while self.update_requests < count:
+                self._received_event.clear()
+                await self._received_event.wait()
+
+    async def run_load(self, rate, duration, kinds="das", joins=100, tick=0.01):
+        """Send random join traffic at rate frames/sec for duration seconds"""
+        per_tick = rate * tick
+        owed = 0.0
+        start = time.perf_counter()
+        values = itertools.count()
+        for step in itertools.count(1):
+            if time.perf_counter() - start >= duration:
+                break
+            owed += per_tick
+            while owed >= 1:
+                owed -= 1
+                kind = random.choice(kinds)
+                join = random.randint(1, joins)
+                value = next(values)
+                if kind == "d":
+                    self.send_digital(join, value & 1)
+                elif kind == "a":
+                    self.send_analog(join, value & 0xFFFF)
+                else:
+                    self.send_serial(join, f"load {value}")
+            await self.drain()
+            delay = start + step * tick - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def _read_loop(self):
+        buffer = bytearray()
+        while True:
+            data = await self._reader.read(65536)
+            if not data:
+                break
+            buffer += data
+            offset = 0
+            while True:
+                if buffer[offset : offset + 1] == codec.UPDATE_REQUEST:
+                    self.update_requests += 1
+                    self.send_dump()
+                    offset += 1
+                    continue
+                frame = codec.decode_frame(buffer, offset)
+                if frame is None:
+                    break
+                kind, join, value, offset = frame
+                if kind in (codec.DIGITAL, codec.ANALOG, codec.SERIAL):
+                    self.received.append((kind, join, value))
+                else:
+                    _LOGGER.warning(f"Unexpected data from hub: {kind} {value}")
+            del buffer[:offset]
+            self._received_event.set()
+        self._received_event.set()
+
+
+async def _run_cli(args):
+    async with ControlSystemSimulator(
+        args.host,
+        args.port,
+        digital={join: False for join in range(1, args.dump_digital + 1)},
+        analog={join: 0 for join in range(1, args.dump_analog + 1)},
+        serial={join: "" for join in range(1, args.dump_serial + 1)},
+    ) as sim:
+        if args.sync_every:
+            async def resync():
+                while True:
+                    await asyncio.sleep(args.sync_every)
+                    sim.request_sync()
+
+            resync_task = asyncio.create_task(resync())
+        start = time.perf_counter()
+        await sim.run_load(args.rate, args.duration, args.types, args.joins)
+        elapsed = time.perf_counter() - start
+        if args.sync_every:
+            resync_task.cancel()
+        await asyncio.sleep(0.5)
+    print(
+        f"Sent {sim.frames_sent} frames ({sim.bytes_sent} bytes) in {elapsed:.2f}s "
+        f"= {sim.frames_sent / elapsed:.0f} frames/sec"
+    )
+    print(
+        f"Received {len(sim.received)} frames, {sim.update_requests} update requests"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--rate", type=float, default=100, help="frames/sec to send")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of load")
+    parser.add_argument("--types", default="das", help="join types to send: any of d, a, s")
+    parser.add_argument("--joins", type=int, default=100, help="join numbers to use (1..N)")
+    parser.add_argument("--dump-digital", type=int, default=0, help="digital joins in the 0xFD dump")
+    parser.add_argument("--dump-analog", type=int, default=0, help="analog joins in the 0xFD dump")
+    parser.add_argument("--dump-serial", type=int, default=0, help="serial joins in the 0xFD dump")
+    parser.add_argument("--sync-every", type=float, default=0, help="send 0xFB every N seconds")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    asyncio.run(_run_cli(args))
+
+
+if __name__ == "__main__":
+    main()